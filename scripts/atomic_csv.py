@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Shared CSV writer for the pipeline scripts."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, Mapping, Sequence
+import csv
+import io
+
+
+def atomic_write_csv(
+    path: Path, header: Sequence[str], rows: Iterable[Mapping[str, object]]
+) -> None:
+    """Write rows projected onto header (missing keys as "") and publish with a rename.
+
+    The whole file is formatted in memory and written beside the target in
+    one call, then renamed over it, so an interrupted run never leaves a
+    truncated CSV; the temporary file is removed if writing fails.
+    """
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows([row.get(key, "") for key in header] for row in rows)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    try:
+        tmp_path.write_bytes(buffer.getvalue().encode("utf-8"))
+        tmp_path.replace(path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
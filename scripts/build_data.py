@@ -4,26 +4,62 @@
 from __future__ import annotations
 
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import lru_cache
 from math import asin, cos, radians, sin, sqrt
 from pathlib import Path
+from typing import Iterable, Iterator
 import csv
+import gzip
 import json
 import re
 from urllib.error import URLError
-from urllib.request import urlopen
+from urllib.request import Request, urlopen
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional accelerator
+    ijson = None
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional accelerator
+    np = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
 
 RAW_DIR = Path("data/raw")
 PROC_DIR = Path("data/processed")
 CACHE_PATH = Path("data/cache/postcodes.json")
-LSOA_CACHE_PATH = Path("data/cache/postcode_lsoa.json")
+LSOA_CACHE_PATH = Path("data/cache/postcode_lsoa.jsonl.gz")
+LEGACY_LSOA_LOG_PATH = Path("data/cache/postcode_lsoa.jsonl")
+LEGACY_LSOA_CACHE_PATH = Path("data/cache/postcode_lsoa.json")
+POSTCODES_BULK_URL = "https://api.postcodes.io/postcodes"
+POSTCODES_BULK_SIZE = 100
+LIVE_GEOCODE_WORKERS = 4
 
 POSTCODE_RE = re.compile(r"^[A-Z]{1,2}[0-9][A-Z0-9]?[0-9][A-Z]{2}$")
 LSOA_CODE_RE = re.compile(r"^[EW]010\d{5}$")
+LSOA_NAME_SUFFIX_RE = re.compile(r"^(.*\b\d{3})[A-Z]$")
 
+LSOA_CODE_KEYS = ("LSOA11CD", "LSOA21CD", "lsoa_code", "code", "area_code")
+LSOA_NAME_KEYS = ("LSOA11NM", "LSOA21NM", "lsoa_name", "name", "area_name")
+MSOA_CODE_KEYS = ("MSOA11CD", "MSOA21CD", "msoa_code", "code", "area_code")
+MSOA_NAME_KEYS = ("MSOA11NM", "MSOA21NM", "msoa_name", "name", "area_name")
 
-@dataclass
+# Unit-circle (sin, cos) pairs for the synthetic area polygons.
+SYNTHETIC_RADIUS_KM = 4.0
+SYNTHETIC_UNIT_CIRCLE = tuple(
+    (sin(angle), cos(angle)) for angle in (2 * 3.141592653589793 * (step / 18) for step in range(18))
+)
+
+
+@dataclass(frozen=True, slots=True)
 class Practice:
     practice_id: str
     practice_name: str
@@ -33,25 +69,24 @@ class Practice:
     lat: float | None
     lon: float | None
     area_code: str | None
+    lsoa_code: str | None
     geocode_failed: bool
     accepting_adults: str
     accepting_children: str
 
 
 def normalize_postcode(postcode: str) -> str:
-    return re.sub(r"\s+", "", postcode.strip().upper())
+    return "".join(postcode.upper().split())
 
 
+@lru_cache(maxsize=None)
 def canonical_lsoa_area_code(value: str | None) -> str | None:
     if not value:
         return None
     text = value.strip()
     if not text:
         return None
-    if text.startswith("LSOA::"):
-        code = text.replace("LSOA::", "", 1).strip()
-    else:
-        code = text
+    code = text.removeprefix("LSOA::").strip()
     if LSOA_CODE_RE.match(code):
         return f"LSOA::{code}"
     return None
@@ -65,39 +100,131 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return 2 * radius * asin(sqrt(a))
 
 
+def pairwise_haversine_km(
+    lats: list[float], lons: list[float], block_size: int = 512
+) -> list[float] | np.ndarray:
+    """Distances for every unordered pair of points (i < j).
+
+    The NumPy path works through ``block_size`` rows at a time so only the
+    pair distances themselves are held, never the full N x N matrix.
+    """
+    n = len(lats)
+    if np is None or n < 2:
+        # Same formula as haversine_km, with radians/cos hoisted out of the pair loop.
+        rad_lats = [radians(lat) for lat in lats]
+        rad_lons = [radians(lon) for lon in lons]
+        cos_lats = [cos(lat) for lat in rad_lats]
+        diameter = 2 * 6371.0
+        distances = []
+        for i in range(n):
+            lat1, lon1, cos1 = rad_lats[i], rad_lons[i], cos_lats[i]
+            distances.extend(
+                [
+                    diameter * asin(sqrt(sin((lat2 - lat1) / 2) ** 2 + cos1 * cos2 * sin((lon2 - lon1) / 2) ** 2))
+                    for lat2, lon2, cos2 in zip(rad_lats[i + 1 :], rad_lons[i + 1 :], cos_lats[i + 1 :])
+                ]
+            )
+        return distances
+
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    cos_lat = np.cos(lat)
+    out = np.empty(n * (n - 1) // 2)
+    pos = 0
+    for start in range(0, n - 1, block_size):
+        stop = min(start + block_size, n - 1)
+        rows = slice(start, stop)
+        cols = slice(start, n)
+        dlat = lat[rows, None] - lat[None, cols]
+        dlon = lon[rows, None] - lon[None, cols]
+        a = np.sin(dlat / 2) ** 2 + cos_lat[rows, None] * cos_lat[None, cols] * np.sin(dlon / 2) ** 2
+        upper = np.arange(start, n)[None, :] > np.arange(start, stop)[:, None]
+        block = 2 * 6371.0 * np.arcsin(np.sqrt(a[upper]))
+        out[pos : pos + block.size] = block
+        pos += block.size
+    return out
+
+
+def iter_csv(path: Path) -> Iterator[dict[str, str]]:
+    # csv.reader + zip builds each row dict in C; DictReader does it per row in Python.
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        for row in reader:
+            if row:
+                yield dict(zip(header, row))
+
+
 def read_csv(path: Path) -> list[dict[str, str]]:
-    with path.open("r", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+    return list(iter_csv(path))
 
 
-def load_lsoa_boundaries() -> dict[str, dict]:
-    path = RAW_DIR / "lsoa_boundaries.geojson"
-    if not path.exists():
-        return {}
-    payload = json.loads(path.read_text(encoding="utf-8"))
-    features = payload.get("features", [])
-    out: dict[str, dict] = {}
-    code_keys = ("LSOA11CD", "LSOA21CD", "lsoa_code", "code", "area_code")
-    name_keys = ("LSOA11NM", "LSOA21NM", "lsoa_name", "name", "area_name")
+def read_json(path: Path) -> object:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def dumps_json(obj: object) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def write_json(path: Path, obj: object) -> None:
+    path.write_bytes(dumps_json(obj))
+
+
+def write_feature_collection(path: Path, features: Iterable[dict]) -> None:
+    """Write a GeoJSON FeatureCollection one feature at a time."""
+    with path.open("wb") as f:
+        f.write(b'{"type":"FeatureCollection","features":[')
+        for i, feature in enumerate(features):
+            if i:
+                f.write(b",")
+            f.write(dumps_json(feature))
+        f.write(b"]}")
 
-    for feature in features:
+
+def iter_geojson_features(path: Path) -> Iterator[dict]:
+    """Yield features one at a time, streaming the file when ijson is installed."""
+    if ijson is not None:
+        with path.open("rb") as f:
+            yield from ijson.items(f, "features.item", use_float=True)
+        return
+    payload = read_json(path)
+    yield from payload.get("features", [])
+
+
+def first_text(props: dict, keys: tuple[str, ...]) -> str:
+    """Return the first non-blank string value among ``keys``, stripped."""
+    for key in keys:
+        value = props.get(key)
+        if isinstance(value, str):
+            value = value.strip()
+            if value:
+                return value
+    return ""
+
+
+def iter_boundary_areas(
+    path: Path, code_keys: tuple[str, ...], name_keys: tuple[str, ...]
+) -> Iterator[tuple[str, str, object]]:
+    """Yield (code, name, geometry) for each boundary feature with properties."""
+    for feature in iter_geojson_features(path):
         props = feature.get("properties", {})
         if not isinstance(props, dict):
             continue
-        area_code = None
-        for key in code_keys:
-            value = props.get(key)
-            if isinstance(value, str) and value.strip():
-                area_code = value.strip()
-                break
-        if not area_code:
-            continue
-        area_name = None
-        for key in name_keys:
-            value = props.get(key)
-            if isinstance(value, str) and value.strip():
-                area_name = value.strip()
-                break
+        yield first_text(props, code_keys), first_text(props, name_keys), feature.get("geometry")
+
+
+def load_lsoa_boundaries() -> dict[str, dict]:
+    out: dict[str, dict] = {}
+    for row in load_lsoa_boundary_rows():
+        area_code = str(row["lsoa_code"])
+        area_name = str(row["lsoa_name"])
         feature_obj = {
             "type": "Feature",
             "id": area_code,
@@ -105,7 +232,7 @@ def load_lsoa_boundaries() -> dict[str, dict]:
                 "area_code": area_code,
                 "area_name": area_name or area_code,
             },
-            "geometry": feature.get("geometry"),
+            "geometry": row["geometry"],
         }
         out[area_code] = feature_obj
         if area_name:
@@ -114,45 +241,22 @@ def load_lsoa_boundaries() -> dict[str, dict]:
     return out
 
 
+@lru_cache(maxsize=None)
 def load_lsoa_boundary_rows() -> list[dict[str, object]]:
+    """Parse the LSOA boundary file once per run; callers must not mutate the result."""
     path = RAW_DIR / "lsoa_boundaries.geojson"
     if not path.exists():
         return []
-    payload = json.loads(path.read_text(encoding="utf-8"))
-    features = payload.get("features", [])
-    out: list[dict[str, object]] = []
-    code_keys = ("LSOA11CD", "LSOA21CD", "lsoa_code", "code", "area_code")
-    name_keys = ("LSOA11NM", "LSOA21NM", "lsoa_name", "name", "area_name")
-
-    for feature in features:
-        props = feature.get("properties", {})
-        if not isinstance(props, dict):
-            continue
-        lsoa_code = ""
-        for key in code_keys:
-            value = props.get(key)
-            if isinstance(value, str) and value.strip():
-                lsoa_code = value.strip()
-                break
-        if not lsoa_code:
-            continue
-        lsoa_name = ""
-        for key in name_keys:
-            value = props.get(key)
-            if isinstance(value, str) and value.strip():
-                lsoa_name = value.strip()
-                break
-        out.append(
-            {
-                "lsoa_code": lsoa_code,
-                "lsoa_name": lsoa_name,
-                "geometry": feature.get("geometry"),
-            }
-        )
-    return out
+    return [
+        {"lsoa_code": lsoa_code, "lsoa_name": lsoa_name, "geometry": geometry}
+        for lsoa_code, lsoa_name, geometry in iter_boundary_areas(path, LSOA_CODE_KEYS, LSOA_NAME_KEYS)
+        if lsoa_code
+    ]
 
 
+@lru_cache(maxsize=None)
 def load_msoa_boundary_rows() -> list[dict[str, object]]:
+    """Parse the MSOA boundary file once per run; callers must not mutate the result."""
     candidates = [
         RAW_DIR / "msoa_boundaries.geojson",
         RAW_DIR / "Middle_layer_Super_Output_Areas_December_2021_Boundaries_EW_BGC_V3_4916445166053426.geojson",
@@ -165,50 +269,43 @@ def load_msoa_boundary_rows() -> list[dict[str, object]]:
     if path is None:
         return []
 
-    payload = json.loads(path.read_text(encoding="utf-8"))
-    features = payload.get("features", [])
-    out: list[dict[str, object]] = []
-    code_keys = ("MSOA11CD", "MSOA21CD", "msoa_code", "code", "area_code")
-    name_keys = ("MSOA11NM", "MSOA21NM", "msoa_name", "name", "area_name")
-
-    for feature in features:
-        props = feature.get("properties", {})
-        if not isinstance(props, dict):
-            continue
-        msoa_code = ""
-        for key in code_keys:
-            value = props.get(key)
-            if isinstance(value, str) and value.strip():
-                msoa_code = value.strip()
-                break
-        msoa_name = ""
-        for key in name_keys:
-            value = props.get(key)
-            if isinstance(value, str) and value.strip():
-                msoa_name = value.strip()
-                break
-        if not msoa_name and not msoa_code:
-            continue
-        out.append(
-            {
-                "msoa_code": msoa_code,
-                "msoa_name": msoa_name,
-                "geometry": feature.get("geometry"),
-            }
-        )
-    return out
+    return [
+        {"msoa_code": msoa_code, "msoa_name": msoa_name, "geometry": geometry}
+        for msoa_code, msoa_name, geometry in iter_boundary_areas(path, MSOA_CODE_KEYS, MSOA_NAME_KEYS)
+        if msoa_code or msoa_name
+    ]
 
 
 def load_postcode_lsoa_cache() -> dict[str, dict[str, str]]:
-    if not LSOA_CACHE_PATH.exists():
-        return {}
-    try:
-        payload = json.loads(LSOA_CACHE_PATH.read_text(encoding="utf-8"))
-    except json.JSONDecodeError:
+    # Written by enrich_practices_lsoa.py as a gzipped JSON-lines log; later lines win.
+    if LSOA_CACHE_PATH.exists():
+        f = gzip.open(LSOA_CACHE_PATH, "rb")
+    elif LEGACY_LSOA_LOG_PATH.exists():
+        f = LEGACY_LSOA_LOG_PATH.open("rb")
+    else:
+        if not LEGACY_LSOA_CACHE_PATH.exists():
+            return {}
+        try:
+            payload = read_json(LEGACY_LSOA_CACHE_PATH)
+        except json.JSONDecodeError:
+            return {}
+        if isinstance(payload, dict):
+            return payload
         return {}
-    if isinstance(payload, dict):
-        return payload
-    return {}
+    loads = orjson.loads if orjson is not None else json.loads
+    cache: dict[str, dict[str, str]] = {}
+    with f:
+        try:
+            for line in f:
+                try:
+                    entry = loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(entry, dict) and isinstance(entry.get("data"), dict):
+                    cache[str(entry.get("postcode"))] = entry["data"]
+        except (EOFError, gzip.BadGzipFile):
+            pass  # truncated final gzip member; keep what was read
+    return cache
 
 
 def load_practice_lsoa_to_msoa_map() -> dict[str, str]:
@@ -220,11 +317,8 @@ def load_practice_lsoa_to_msoa_map() -> dict[str, str]:
     if not cache:
         return {}
 
-    with path.open("r", encoding="utf-8") as f:
-        rows = list(csv.DictReader(f))
-
-    by_lsoa: dict[str, Counter] = defaultdict(Counter)
-    for row in rows:
+    pair_counts: Counter = Counter()
+    for row in iter_csv(path):
         postcode_norm = normalize_postcode(row.get("postcode", ""))
         if not postcode_norm:
             continue
@@ -235,11 +329,15 @@ def load_practice_lsoa_to_msoa_map() -> dict[str, str]:
         lsoa_code = lsoa_code_from_area((row.get("area_code") or "").strip())
         if not lsoa_code:
             continue
-        by_lsoa[lsoa_code][msoa_name] += 1
+        pair_counts[(lsoa_code, msoa_name)] += 1
 
+    # Most common MSOA per LSOA; ties go to the first seen, as most_common does.
     out: dict[str, str] = {}
-    for lsoa_code, counts in by_lsoa.items():
-        out[lsoa_code] = counts.most_common(1)[0][0]
+    best: dict[str, int] = {}
+    for (lsoa_code, msoa_name), count in pair_counts.items():
+        if count > best.get(lsoa_code, 0):
+            best[lsoa_code] = count
+            out[lsoa_code] = msoa_name
     return out
 
 
@@ -248,32 +346,63 @@ def load_lookup() -> dict[str, dict[str, str]]:
     return {row["postcode"]: row for row in rows}
 
 
-def geocode_postcode_live(postcode_norm: str) -> dict[str, str] | None:
-    endpoint = f"https://api.postcodes.io/postcodes/{postcode_norm}"
+def geocode_postcode_batch_live(postcodes: list[str]) -> dict[str, dict[str, str]]:
+    payload = json.dumps({"postcodes": postcodes}).encode("utf-8")
+    request = Request(
+        POSTCODES_BULK_URL,
+        data=payload,
+        method="POST",
+        headers={"Content-Type": "application/json", "Accept": "application/json"},
+    )
     try:
-        with urlopen(endpoint, timeout=4) as response:
-            payload = json.loads(response.read().decode("utf-8"))
-        result = payload.get("result")
-        if not result:
-            return None
-        return {
-            "lat": str(result["latitude"]),
-            "lon": str(result["longitude"]),
-            "area_code": str(result.get("lsoa") or ""),
-        }
-    except (URLError, TimeoutError, ValueError, KeyError):
-        return None
+        with urlopen(request, timeout=30) as response:
+            body = json.loads(response.read().decode("utf-8"))
+        out: dict[str, dict[str, str]] = {}
+        for item in body.get("result") or []:
+            result = item.get("result")
+            if not result or result.get("latitude") is None or result.get("longitude") is None:
+                continue
+            out[normalize_postcode(str(item.get("query", "")))] = {
+                "lat": str(result["latitude"]),
+                "lon": str(result["longitude"]),
+                "area_code": str(result.get("lsoa") or ""),
+            }
+        return out
+    except (URLError, TimeoutError, ValueError, KeyError, AttributeError):
+        return {}
+
+
+def geocode_postcodes_live(postcodes: list[str]) -> dict[str, dict[str, str]]:
+    batches = [
+        postcodes[i : i + POSTCODES_BULK_SIZE] for i in range(0, len(postcodes), POSTCODES_BULK_SIZE)
+    ]
+    if not batches:
+        return {}
+    out: dict[str, dict[str, str]] = {}
+    with ThreadPoolExecutor(max_workers=min(LIVE_GEOCODE_WORKERS, len(batches))) as executor:
+        for result in executor.map(geocode_postcode_batch_live, batches):
+            out.update(result)
+    return out
+
+
+def has_source_coords(row: dict[str, str]) -> bool:
+    try:
+        float(row.get("lat", "").strip())
+        float(row.get("lon", "").strip())
+    except ValueError:
+        return False
+    return True
 
 
 def load_cache() -> dict[str, dict[str, str]]:
     if not CACHE_PATH.exists():
         return {}
-    return json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+    return read_json(CACHE_PATH)
 
 
 def save_cache(cache: dict[str, dict[str, str]]) -> None:
     CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    CACHE_PATH.write_text(json.dumps(cache, separators=(",", ":")), encoding="utf-8")
+    write_json(CACHE_PATH, cache)
 
 
 def build_practices() -> tuple[list[Practice], dict[str, int], list[str]]:
@@ -282,20 +411,31 @@ def build_practices() -> tuple[list[Practice], dict[str, int], list[str]]:
     lookup = load_lookup()
     cache = load_cache()
 
+    # Resolve postcodes that are in neither the cache nor the lookup up
+    # front, concurrently, rather than one blocking request per row.
+    postcode_norms = [normalize_postcode(row["postcode"]) for row in practices_raw]
+    live_needed = set()
+    for row, postcode_norm in zip(practices_raw, postcode_norms):
+        if not POSTCODE_RE.match(postcode_norm) or has_source_coords(row):
+            continue
+        if cache.get(postcode_norm) or lookup.get(postcode_norm):
+            continue
+        live_needed.add(postcode_norm)
+    live_geocodes = geocode_postcodes_live(sorted(live_needed))
+
     warnings: list[str] = []
-    warning_counts = Counter()
+    warning_counts: dict[str, int] = defaultdict(int)
     results: list[Practice] = []
     seen = set()
 
-    for row in practices_raw:
+    for row, postcode_norm in zip(practices_raw, postcode_norms):
         practice_id = row["practice_id"].strip()
-        key = (row["practice_name"].strip().lower(), normalize_postcode(row["postcode"]))
+        key = (row["practice_name"].strip().lower(), postcode_norm)
         if key in seen:
             warning_counts["deduplicated_practices"] += 1
             continue
         seen.add(key)
 
-        postcode_norm = normalize_postcode(row["postcode"])
         if not postcode_norm:
             warning_counts["missing_postcode"] += 1
             warnings.append(f"{practice_id}: missing postcode")
@@ -340,7 +480,7 @@ def build_practices() -> tuple[list[Practice], dict[str, int], list[str]]:
 
         geocode = None
         if geocode_failed:
-            geocode = cache.get(postcode_norm) or lookup.get(postcode_norm) or geocode_postcode_live(postcode_norm)
+            geocode = cache.get(postcode_norm) or lookup.get(postcode_norm) or live_geocodes.get(postcode_norm)
 
         if geocode and geocode_failed:
             lat = float(geocode["lat"])
@@ -368,6 +508,7 @@ def build_practices() -> tuple[list[Practice], dict[str, int], list[str]]:
                 lat=lat,
                 lon=lon,
                 area_code=area_code,
+                lsoa_code=lsoa_code_from_area(area_code),
                 geocode_failed=geocode_failed,
                 accepting_adults=availability.get("accepting_adults", "unknown").strip().lower(),
                 accepting_children=availability.get("accepting_children", "unknown").strip().lower(),
@@ -378,35 +519,31 @@ def build_practices() -> tuple[list[Practice], dict[str, int], list[str]]:
     return results, dict(warning_counts), warnings
 
 
-def write_practices_geojson(practices: list[Practice]) -> None:
-    features = []
+def iter_practice_features(practices: list[Practice]) -> Iterator[dict]:
     for p in practices:
         if p.geocode_failed or p.lat is None or p.lon is None:
             continue
-        lsoa_code = lsoa_code_from_area(p.area_code)
-        if lsoa_code and LSOA_CODE_RE.match(lsoa_code) and not is_england_lsoa_code(lsoa_code):
+        lsoa_code = p.lsoa_code
+        if lsoa_code and not is_england_lsoa_code(lsoa_code) and LSOA_CODE_RE.match(lsoa_code):
             continue
-        features.append(
-            {
-                "type": "Feature",
-                "id": p.practice_id,
-                "geometry": {"type": "Point", "coordinates": [p.lon, p.lat]},
-                "properties": {
-                    "practice_id": p.practice_id,
-                    "practice_name": p.practice_name,
-                    "address": p.address,
-                    "postcode": p.postcode,
-                    "area_code": p.area_code,
-                    "accepting_adults": p.accepting_adults,
-                    "accepting_children": p.accepting_children,
-                },
-            }
-        )
+        yield {
+            "type": "Feature",
+            "id": p.practice_id,
+            "geometry": {"type": "Point", "coordinates": [p.lon, p.lat]},
+            "properties": {
+                "practice_id": p.practice_id,
+                "practice_name": p.practice_name,
+                "address": p.address,
+                "postcode": p.postcode,
+                "area_code": p.area_code,
+                "accepting_adults": p.accepting_adults,
+                "accepting_children": p.accepting_children,
+            },
+        }
 
-    obj = {"type": "FeatureCollection", "features": features}
-    (PROC_DIR / "practices.geojson").write_text(
-        json.dumps(obj, separators=(",", ":")), encoding="utf-8"
-    )
+
+def write_practices_geojson(practices: list[Practice]) -> None:
+    write_feature_collection(PROC_DIR / "practices.geojson", iter_practice_features(practices))
 
 
 def derive_msoa_name_from_lsoa_name(lsoa_name: str) -> str | None:
@@ -414,7 +551,7 @@ def derive_msoa_name_from_lsoa_name(lsoa_name: str) -> str | None:
     if not text:
         return None
     # Typical pattern: "Wandsworth 026B" -> "Wandsworth 026"
-    match = re.match(r"^(.*\b\d{3})[A-Z]$", text)
+    match = LSOA_NAME_SUFFIX_RE.match(text)
     if match:
         return match.group(1).strip()
     return None
@@ -428,12 +565,11 @@ def msoa_key_from_code(msoa_code: str) -> str:
     return f"MSOA::{msoa_code}"
 
 
+@lru_cache(maxsize=None)
 def lsoa_code_from_area(area_code: str | None) -> str | None:
     if not area_code:
         return None
-    value = area_code.strip()
-    if value.startswith("LSOA::"):
-        value = value.replace("LSOA::", "", 1).strip()
+    value = area_code.strip().removeprefix("LSOA::").strip()
     if value:
         return value
     return None
@@ -504,10 +640,10 @@ def write_areas_and_metrics(practices: list[Practice]) -> dict[str, dict[str, fl
 
     counts = defaultdict(lambda: {"total": 0, "adults_yes": 0, "children_yes": 0})
     practice_centroids: dict[str, tuple[float, float]] = {}
-    grouped = defaultdict(list)
+    coord_sums = defaultdict(lambda: [0.0, 0.0, 0])
 
     for p in practices:
-        lsoa_code = lsoa_code_from_area(p.area_code)
+        lsoa_code = p.lsoa_code
         if not is_england_lsoa_code(lsoa_code):
             continue
         if not lsoa_code:
@@ -521,12 +657,13 @@ def write_areas_and_metrics(practices: list[Practice]) -> dict[str, dict[str, fl
         if p.accepting_children == "yes":
             counts[msoa_key]["children_yes"] += 1
         if p.lat is not None and p.lon is not None and not p.geocode_failed:
-            grouped[msoa_key].append((p.lat, p.lon))
+            sums = coord_sums[msoa_key]
+            sums[0] += p.lat
+            sums[1] += p.lon
+            sums[2] += 1
 
-    for area_code, coords in grouped.items():
-        avg_lat = sum(lat for lat, _ in coords) / len(coords)
-        avg_lon = sum(lon for _, lon in coords) / len(coords)
-        practice_centroids[area_code] = (avg_lat, avg_lon)
+    for area_code, (sum_lat, sum_lon, n) in coord_sums.items():
+        practice_centroids[area_code] = (sum_lat / n, sum_lon / n)
 
     metrics: dict[str, dict[str, float | int | str | None]] = {}
     for msoa_key, pop in msoa_population.items():
@@ -678,16 +815,12 @@ def write_areas_and_metrics(practices: list[Practice]) -> dict[str, dict[str, fl
         for i, area_code in enumerate(metrics):
             area_name = str(metrics[area_code]["area_name"])
             center_lat, center_lon = practice_centroids.get(area_code, (51.0 + i * 0.02, -1.0 - i * 0.02))
-            radius_km = 4.0
-            steps = 18
-            coords = []
-            for step in range(steps):
-                angle = 2 * 3.141592653589793 * (step / steps)
-                dlat = radius_km / 111.0
-                dlon = dlat / max(cos(radians(center_lat)), 0.25)
-                lat = center_lat + dlat * sin(angle)
-                lon = center_lon + dlon * cos(angle)
-                coords.append([lon, lat])
+            dlat = SYNTHETIC_RADIUS_KM / 111.0
+            dlon = dlat / max(cos(radians(center_lat)), 0.25)
+            coords = [
+                [center_lon + dlon * cos_a, center_lat + dlat * sin_a]
+                for sin_a, cos_a in SYNTHETIC_UNIT_CIRCLE
+            ]
             coords.append(coords[0])
             areas_features.append(
                 {
@@ -702,13 +835,8 @@ def write_areas_and_metrics(practices: list[Practice]) -> dict[str, dict[str, fl
                 }
             )
 
-    (PROC_DIR / "area_metrics.json").write_text(
-        json.dumps(metrics, separators=(",", ":")), encoding="utf-8"
-    )
-    (PROC_DIR / "areas.geojson").write_text(
-        json.dumps({"type": "FeatureCollection", "features": areas_features}, separators=(",", ":")),
-        encoding="utf-8",
-    )
+    write_json(PROC_DIR / "area_metrics.json", metrics)
+    write_feature_collection(PROC_DIR / "areas.geojson", areas_features)
     return metrics
 
 
@@ -720,23 +848,27 @@ def build_qa(practices: list[Practice], warning_counts: dict[str, int], warnings
         if p.accepting_adults in {"yes", "no"} or p.accepting_children in {"yes", "no"}
     ]
 
-    distances = []
-    for i, p1 in enumerate(geocoded):
-        for p2 in geocoded[i + 1 :]:
-            distances.append(haversine_km(p1.lat, p1.lon, p2.lat, p2.lon))
-
-    if distances:
-        distances_sorted = sorted(distances)
-        mid = len(distances_sorted) // 2
-        median = (
-            distances_sorted[mid]
-            if len(distances_sorted) % 2 == 1
-            else (distances_sorted[mid - 1] + distances_sorted[mid]) / 2
-        )
+    distances = pairwise_haversine_km([p.lat for p in geocoded], [p.lon for p in geocoded])
+
+    if len(distances):
+        if np is not None and isinstance(distances, np.ndarray):
+            min_km = float(np.min(distances))
+            median = float(np.median(distances, overwrite_input=True))
+            max_km = float(np.max(distances))
+        else:
+            distances_sorted = sorted(distances)
+            mid = len(distances_sorted) // 2
+            median = (
+                distances_sorted[mid]
+                if len(distances_sorted) % 2 == 1
+                else (distances_sorted[mid - 1] + distances_sorted[mid]) / 2
+            )
+            min_km = distances_sorted[0]
+            max_km = distances_sorted[-1]
         dist_summary = {
-            "min_km": round(min(distances_sorted), 3),
+            "min_km": round(min_km, 3),
             "median_km": round(median, 3),
-            "max_km": round(max(distances_sorted), 3),
+            "max_km": round(max_km, 3),
         }
     else:
         dist_summary = {"min_km": None, "median_km": None, "max_km": None}
@@ -760,9 +892,7 @@ def build_qa(practices: list[Practice], warning_counts: dict[str, int], warnings
         "distance_summary_between_practices": dist_summary,
     }
 
-    (PROC_DIR / "qa_report.json").write_text(
-        json.dumps(report, separators=(",", ":")), encoding="utf-8"
-    )
+    write_json(PROC_DIR / "qa_report.json", report)
 
 
 def main() -> None:
@@ -770,6 +900,9 @@ def main() -> None:
     practices, warning_counts, warnings = build_practices()
     write_practices_geojson(practices)
     write_areas_and_metrics(practices)
+    # Release parsed boundary geometry before the pairwise QA pass.
+    load_lsoa_boundary_rows.cache_clear()
+    load_msoa_boundary_rows.cache_clear()
     build_qa(practices, warning_counts, warnings)
     print("Built data/processed/{practices.geojson,areas.geojson,area_metrics.json,qa_report.json}")
 
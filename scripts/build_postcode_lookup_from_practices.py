@@ -16,7 +16,7 @@ def normalize_postcode(value: str) -> str:
 
 
 def main() -> None:
-    rows: list[dict[str, str]] = []
+    dedup: dict[str, dict[str, str]] = {}
     if SRC.exists():
         with SRC.open("r", encoding="utf-8") as f:
             for row in csv.DictReader(f):
@@ -25,16 +25,13 @@ def main() -> None:
                 lon = str(row.get("lon") or "").strip()
                 area_code = str(row.get("area_code") or "").strip()
                 if postcode and lat and lon:
-                    rows.append(
-                        {
-                            "postcode": postcode,
-                            "lat": lat,
-                            "lon": lon,
-                            "area_code": area_code,
-                        }
-                    )
-
-    dedup = {row["postcode"]: row for row in rows}
+                    dedup[postcode] = {
+                        "postcode": postcode,
+                        "lat": lat,
+                        "lon": lon,
+                        "area_code": area_code,
+                    }
+
     DST.parent.mkdir(parents=True, exist_ok=True)
     with DST.open("w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=["postcode", "lat", "lon", "area_code"])
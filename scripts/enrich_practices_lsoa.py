@@ -3,55 +3,227 @@
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterator
 import csv
+import gzip
+import hashlib
 import json
 import re
+import threading
+import time
 from urllib.error import URLError
-from urllib.request import Request, urlopen
+
+from atomic_csv import atomic_write_csv
+from keepalive_http import KeepAliveClient
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional accelerator
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
 
 PRACTICES_PATH = Path("data/raw/practices.csv")
-CACHE_PATH = Path("data/cache/postcode_lsoa.json")
+CACHE_PATH = Path("data/cache/postcode_lsoa.jsonl.gz")
+LEGACY_LOG_PATH = Path("data/cache/postcode_lsoa.jsonl")
+LEGACY_CACHE_PATH = Path("data/cache/postcode_lsoa.json")
 LSOA_BOUNDARIES_PATH = Path("data/raw/lsoa_boundaries.geojson")
+LSOA_PROPERTIES_PATH = Path("data/raw/lsoa_properties.json")
+BATCH_CACHE_DIR = Path("data/cache/postcodes_io_batches")
+BATCH_CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600
 LSOA_CODE_RE = re.compile(r"^[EW]010\d{5}$")
+LOOKUP_WORKERS = 8
+POSTCODES_URL = "https://api.postcodes.io/postcodes"
+
+# One kept-alive client per lookup thread, so batches skip the TCP/TLS handshake.
+_thread_clients = threading.local()
+_all_clients: list[KeepAliveClient] = []
+_all_clients_lock = threading.Lock()
 
 
 def normalize_postcode(postcode: str) -> str:
-    return re.sub(r"\s+", "", postcode.strip().upper())
+    return "".join(postcode.upper().split())
+
+
+def read_json(path: Path) -> object:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
 
 
-def load_cache() -> dict[str, dict[str, str]]:
-    if not CACHE_PATH.exists():
-        return {}
-    return json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+def dumps_json(obj: object) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def load_cache() -> tuple[dict[str, dict[str, str]], int]:
+    """Return the cache and the number of log lines it was replayed from.
+
+    The cache is an append-only, gzip-compressed JSON-lines log of
+    {"postcode", "data"} entries where later lines win; each append is a new
+    gzip member. Uncompressed logs and pre-JSONL snapshots are read if present.
+    The line count is 0 when the log must be rewritten rather than appended.
+    """
+    compressed = CACHE_PATH.exists()
+    if compressed:
+        f = gzip.open(CACHE_PATH, "rb")
+    elif LEGACY_LOG_PATH.exists():
+        f = LEGACY_LOG_PATH.open("rb")
+    elif LEGACY_CACHE_PATH.exists():
+        return read_json(LEGACY_CACHE_PATH), 0
+    else:
+        return {}, 0
+    loads = orjson.loads if orjson is not None else json.loads
+    cache: dict[str, dict[str, str]] = {}
+    lines = 0
+    torn = False
+    with f:
+        try:
+            for line in f:
+                lines += 1
+                try:
+                    entry = loads(line)
+                except json.JSONDecodeError:
+                    torn = True  # interrupted append; appending after it would corrupt the next line
+                    continue
+                cache[entry["postcode"]] = entry["data"]
+        except (EOFError, gzip.BadGzipFile):
+            torn = True  # truncated gzip member from an interrupted append
+    # An uncompressed log is migrated by rewriting it as CACHE_PATH.
+    return cache, lines if compressed and not torn else 0
+
+
+def cache_lines(entries: dict[str, dict[str, str]]) -> bytes:
+    return b"".join(
+        dumps_json({"postcode": postcode, "data": data}) + b"\n"
+        for postcode, data in entries.items()
+    )
 
 
-def save_cache(cache: dict[str, dict[str, str]]) -> None:
+def save_cache(
+    cache: dict[str, dict[str, str]], new_entries: dict[str, dict[str, str]], lines: int
+) -> None:
+    """Append new entries, rewriting a compact snapshot when the log has grown stale."""
     CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    CACHE_PATH.write_text(json.dumps(cache, separators=(",", ":")), encoding="utf-8")
+    if lines and lines + len(new_entries) <= 2 * len(cache):
+        if new_entries:
+            with gzip.open(CACHE_PATH, "ab", compresslevel=1) as f:
+                f.write(cache_lines(new_entries))
+        return
+    tmp_path = CACHE_PATH.with_suffix(".tmp")
+    with gzip.open(tmp_path, "wb", compresslevel=1) as f:
+        f.write(cache_lines(cache))
+    tmp_path.replace(CACHE_PATH)
+
+
+def read_csv(path: Path) -> tuple[list[str], list[dict[str, str]]]:
+    """Return the header and the rows; short rows simply lack the trailing keys."""
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return [], []
+        return header, [dict(zip(header, row)) for row in reader if row]
 
 
 def chunked(items: list[str], size: int) -> list[list[str]]:
     return [items[i : i + size] for i in range(0, len(items), size)]
 
 
-def fetch_postcodes_lsoa(postcodes: list[str]) -> dict[str, dict[str, str]]:
-    endpoint = "https://api.postcodes.io/postcodes"
-    payload = json.dumps({"postcodes": postcodes}).encode("utf-8")
-    request = Request(
-        endpoint,
-        data=payload,
-        method="POST",
-        headers={"Content-Type": "application/json", "Accept": "application/json"},
-    )
-    with urlopen(request, timeout=30) as response:
-        body = json.loads(response.read().decode("utf-8"))
+def thread_client() -> KeepAliveClient:
+    client = getattr(_thread_clients, "client", None)
+    if client is None:
+        client = KeepAliveClient(timeout=30)
+        _thread_clients.client = client
+        with _all_clients_lock:
+            _all_clients.append(client)
+    return client
+
+
+def close_clients() -> None:
+    with _all_clients_lock:
+        for client in _all_clients:
+            client.close()
+        _all_clients.clear()
+
+
+def post_postcodes(payload: bytes) -> bytes:
+    """POST a bulk lookup and return the body; errors surface as URLError like urlopen's."""
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    body, _ = thread_client().request("POST", POSTCODES_URL, payload, headers)
+    return body
+
+
+def batch_cache_path(postcodes: list[str]) -> Path:
+    key = hashlib.blake2b("\n".join(sorted(postcodes)).encode("utf-8"), digest_size=16).hexdigest()
+    return BATCH_CACHE_DIR / f"{key}.json"
+
+
+def prune_batch_cache() -> None:
+    if not BATCH_CACHE_DIR.exists():
+        return
+    cutoff = time.time() - BATCH_CACHE_MAX_AGE_SECONDS
+    for path in BATCH_CACHE_DIR.glob("*.json"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+
+
+def parse_batch_response(raw: bytes) -> list[dict[str, object]] | None:
+    """Return the result items of a postcodes.io bulk response, or None if it is not one."""
+    try:
+        body = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(body, dict) or not isinstance(body.get("result"), list):
+        return None
+    items = body["result"]
+    if not all(isinstance(item, dict) for item in items):
+        return None
+    return items
+
+
+def fetch_postcodes_lsoa(postcodes: list[str]) -> tuple[dict[str, dict[str, str]], bool]:
+    """Look up one batch, replaying a recent identical batch's response from disk.
+
+    Postcodes that postcodes.io cannot resolve stay uncached and are asked
+    for again on every run; the batch cache stops that re-querying until the
+    stored response ages out. Also returns whether the response was replayed.
+    Only responses that parse as a bulk lookup are stored; a stored file that
+    no longer parses is dropped and the batch is fetched again.
+    """
+    cache_path = batch_cache_path(postcodes)
+    items = None
+    if cache_path.exists() and time.time() - cache_path.stat().st_mtime < BATCH_CACHE_MAX_AGE_SECONDS:
+        items = parse_batch_response(cache_path.read_bytes())
+        if items is None:
+            cache_path.unlink(missing_ok=True)
+    replayed = items is not None
+    if items is None:
+        raw = post_postcodes(dumps_json({"postcodes": postcodes}))
+        items = parse_batch_response(raw)
+        if items is None:
+            # Surfaces like a transport failure: main keeps the cached values and moves on.
+            raise URLError("postcodes.io returned an unexpected response body")
+        BATCH_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        tmp_path.write_bytes(raw)
+        tmp_path.replace(cache_path)
 
     results: dict[str, dict[str, str]] = {}
-    for item in body.get("result", []):
+    for item in items:
         query = normalize_postcode(str(item.get("query", "")))
-        result = item.get("result") or {}
-        codes = result.get("codes") or {}
+        result = item.get("result")
+        if not isinstance(result, dict):
+            result = {}
+        codes = result.get("codes")
+        if not isinstance(codes, dict):
+            codes = {}
         lsoa = str(result.get("lsoa") or "").strip()
         msoa = str(result.get("msoa") or "").strip()
         lsoa_code = str(codes.get("lsoa") or "").strip()
@@ -62,21 +234,48 @@ def fetch_postcodes_lsoa(postcodes: list[str]) -> dict[str, dict[str, str]]:
             "lsoa_code": lsoa_code,
             "msoa_code": msoa_code,
         }
-    return results
+    return results, replayed
 
 
-def load_lsoa_name_to_code() -> dict[str, str]:
+def iter_boundary_properties(path: Path) -> Iterator[object]:
+    """Yield each feature's properties; with ijson, geometries are never built."""
+    if ijson is not None:
+        with path.open("rb") as f:
+            yield from ijson.items(f, "features.item.properties", use_float=True)
+        return
+    payload = read_json(path)
+    for feature in payload.get("features", []):
+        yield feature.get("properties", {})
+
+
+def iter_lsoa_code_names() -> Iterator[tuple[str, str]]:
+    """Yield (code, name) per LSOA, preferring the properties sidecar when current.
+
+    fetch_lsoa_boundaries.py writes the sidecar next to the boundaries; it is
+    ignored if the GeoJSON has been replaced since.
+    """
+    if LSOA_PROPERTIES_PATH.exists() and (
+        not LSOA_BOUNDARIES_PATH.exists()
+        or LSOA_PROPERTIES_PATH.stat().st_mtime >= LSOA_BOUNDARIES_PATH.stat().st_mtime
+    ):
+        payload = read_json(LSOA_PROPERTIES_PATH)
+        if isinstance(payload, dict):
+            for code, name in payload.items():
+                yield str(code), str(name or "")
+            return
     if not LSOA_BOUNDARIES_PATH.exists():
-        return {}
-    payload = json.loads(LSOA_BOUNDARIES_PATH.read_text(encoding="utf-8"))
-    features = payload.get("features", [])
-    lookup: dict[str, str] = {}
-    for feature in features:
-        props = feature.get("properties", {})
+        return
+    for props in iter_boundary_properties(LSOA_BOUNDARIES_PATH):
         if not isinstance(props, dict):
             continue
         code = str(props.get("LSOA21CD") or props.get("LSOA11CD") or "").strip()
         name = str(props.get("LSOA21NM") or props.get("LSOA11NM") or "").strip()
+        yield code, name
+
+
+def load_lsoa_name_to_code() -> dict[str, str]:
+    lookup: dict[str, str] = {}
+    for code, name in iter_lsoa_code_names():
         if code and name:
             lookup[name] = code
             lookup[name.upper()] = code
@@ -96,62 +295,86 @@ def main() -> None:
         print(f"Skipped LSOA enrichment; {PRACTICES_PATH} not found.")
         return
 
-    with PRACTICES_PATH.open("r", encoding="utf-8") as f:
-        rows = list(csv.DictReader(f))
+    fieldnames, rows = read_csv(PRACTICES_PATH)
+    postcode_norms = [normalize_postcode(row.get("postcode", "")) for row in rows]
 
-    cache = load_cache()
+    cache, cache_log_lines = load_cache()
     lsoa_name_to_code = load_lsoa_name_to_code()
+    # Check each distinct postcode against the cache once, not once per practice row.
     needed = sorted(
-        {
-            normalize_postcode(row.get("postcode", ""))
-            for row in rows
-            if normalize_postcode(row.get("postcode", ""))
-            and not cached_has_canonical_lsoa(
-                cache.get(normalize_postcode(row.get("postcode", "")), {})
-            )
-        }
+        postcode_norm
+        for postcode_norm in set(postcode_norms)
+        if postcode_norm and not cached_has_canonical_lsoa(cache.get(postcode_norm, {}))
     )
 
     fetched = 0
+    replayed = 0
+    new_entries: dict[str, dict[str, str]] = {}
+    prune_batch_cache()
     if needed:
-        for batch in chunked(needed, 100):
-            try:
-                result = fetch_postcodes_lsoa(batch)
-                cache.update(result)
-                fetched += len(batch)
-            except URLError as exc:
-                print(f"LSOA lookup warning: {exc}. Continuing with cached values.")
-                break
+        batches = chunked(needed, 100)
+        try:
+            with ThreadPoolExecutor(max_workers=min(LOOKUP_WORKERS, len(batches))) as executor:
+                futures = [executor.submit(fetch_postcodes_lsoa, batch) for batch in batches]
+                # Merge in batch order and stop at the first failure, as the serial loop did.
+                for batch, future in zip(batches, futures):
+                    try:
+                        result, from_batch_cache = future.result()
+                    except URLError as exc:
+                        print(f"LSOA lookup warning: {exc}. Continuing with cached values.")
+                        executor.shutdown(cancel_futures=True)
+                        break
+                    cache.update(result)
+                    new_entries.update(result)
+                    if from_batch_cache:
+                        replayed += len(batch)
+                    else:
+                        fetched += len(batch)
+        finally:
+            close_clients()
 
     updated = 0
-    for row in rows:
-        postcode_norm = normalize_postcode(row.get("postcode", ""))
+    is_lsoa_code = LSOA_CODE_RE.match
+    lookup_code = lsoa_name_to_code.get
+    cache_get = cache.get
+    # The new area code depends only on the postcode, so resolve it once per postcode.
+    area_by_postcode: dict[str, str] = {}
+    for row, postcode_norm in zip(rows, postcode_norms):
         if not postcode_norm:
             continue
-        cached = cache.get(postcode_norm, {})
-        lsoa = cached.get("lsoa", "")
-        lsoa_code = str(cached.get("lsoa_code") or "").strip()
         existing_area = row.get("area_code", "").strip()
-        if lsoa and (not existing_area or existing_area.startswith("COUNTY::")):
-            code = ""
-            if LSOA_CODE_RE.match(lsoa_code):
-                code = lsoa_code
-            elif LSOA_CODE_RE.match(str(lsoa)):
-                code = str(lsoa)
-            else:
-                code = lsoa_name_to_code.get(lsoa) or lsoa_name_to_code.get(lsoa.upper()) or ""
-            row["area_code"] = f"LSOA::{code}" if code else f"LSOA::{lsoa}"
+        if existing_area and not existing_area.startswith("COUNTY::"):
+            continue
+        area_code = area_by_postcode.get(postcode_norm)
+        if area_code is None:
+            cached = cache_get(postcode_norm, {})
+            lsoa = cached.get("lsoa", "")
+            area_code = ""
+            if lsoa:
+                lsoa_code = str(cached.get("lsoa_code") or "").strip()
+                if is_lsoa_code(lsoa_code):
+                    code = lsoa_code
+                elif is_lsoa_code(str(lsoa)):
+                    code = str(lsoa)
+                else:
+                    code = lookup_code(lsoa) or lookup_code(lsoa.upper()) or ""
+                area_code = f"LSOA::{code}" if code else f"LSOA::{lsoa}"
+            area_by_postcode[postcode_norm] = area_code
+        if area_code:
+            row["area_code"] = area_code
             updated += 1
 
     if rows:
-        fieldnames = list(rows[0].keys())
-        with PRACTICES_PATH.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-
-    save_cache(cache)
-    print(f"LSOA enrichment complete: updated={updated}, fetched_postcodes={fetched}, cache_size={len(cache)}")
+        if updated and "area_code" not in fieldnames:
+            fieldnames.append("area_code")
+        # practices.csv is also the input, so never leave it half-written.
+        atomic_write_csv(PRACTICES_PATH, fieldnames, rows)
+
+    save_cache(cache, new_entries, cache_log_lines)
+    print(
+        f"LSOA enrichment complete: updated={updated}, fetched_postcodes={fetched}, "
+        f"replayed_postcodes={replayed}, cache_size={len(cache)}"
+    )
 
 
 if __name__ == "__main__":
@@ -6,26 +6,18 @@ from __future__ import annotations
 from pathlib import Path
 import csv
 
+from atomic_csv import atomic_write_csv
 from nhs_live import read_normalized_snapshot
 
 OUT = Path("data/raw/availability.csv")
 SEED_PATH = Path("data/seed/availability.csv")
 
-
-def write_csv(rows: list[dict[str, str]]) -> None:
-    OUT.parent.mkdir(parents=True, exist_ok=True)
-    with OUT.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "practice_id",
-                "accepting_adults",
-                "accepting_children",
-                "last_reported",
-            ],
-        )
-        writer.writeheader()
-        writer.writerows(rows)
+FIELDS = (
+    "practice_id",
+    "accepting_adults",
+    "accepting_children",
+    "last_reported",
+)
 
 
 def load_seed_rows() -> list[dict[str, str]]:
@@ -50,11 +42,11 @@ def main() -> None:
     ]
 
     if rows:
-        write_csv(rows)
+        atomic_write_csv(OUT, FIELDS, rows)
         print(f"Wrote {OUT} ({len(rows)} rows, source=normalized)")
         return
 
-    write_csv(seed_rows)
+    atomic_write_csv(OUT, FIELDS, seed_rows)
     print(f"Wrote {OUT} ({len(seed_rows)} rows, source=seed)")
 
 
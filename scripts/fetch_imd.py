@@ -4,62 +4,130 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Iterator
 import csv
+import io
+import json
 import os
-from urllib.error import URLError
-from urllib.request import urlopen
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from atomic_csv import atomic_write_csv
 
 IMD_OUT = Path("data/raw/imd.csv")
 POSTCODE_OUT = Path("data/raw/postcode_lookup.csv")
 PRACTICES_PATH = Path("data/raw/practices.csv")
 SEED_PATH = Path("data/seed/imd.csv")
-
-def write_csv(path: Path, rows: list[dict[str, str]], fieldnames: list[str]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
-
-
-def load_existing_imd_rows() -> list[dict[str, str]]:
+VALIDATORS_PATH = Path("data/cache/imd_source.json")
+DEFAULT_IMD_URL = (
+    "https://assets.publishing.service.gov.uk/media/691ded56d140bbbaa59a2a7d/"
+    "File_7_IoD2025_All_Ranks_Scores_Deciles_Population_Denominators.csv"
+)
+
+def read_csv(path: Path) -> list[dict[str, str]]:
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return []
+        return [dict(zip(header, row)) for row in reader if row]
+
+
+def iter_csv_columns(path: Path, columns: list[str]) -> Iterator[tuple[str, ...]]:
+    """Stream only the named columns, as tuples in the given order ("" when absent)."""
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        index = {name: i for i, name in enumerate(header)}
+        positions = [index.get(name, -1) for name in columns]
+        for row in reader:
+            if not row:
+                continue
+            width = len(row)
+            yield tuple(row[i] if 0 <= i < width else "" for i in positions)
+
+
+def count_existing_imd_rows() -> int:
     if not IMD_OUT.exists():
-        return []
-    with IMD_OUT.open("r", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+        return 0
+    with IMD_OUT.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        if next(reader, None) is None:
+            return 0
+        return sum(1 for row in reader if row)
 
 
 def load_seed_rows() -> list[dict[str, str]]:
     if not SEED_PATH.exists():
         raise FileNotFoundError(f"Seed file not found: {SEED_PATH}")
-    with SEED_PATH.open("r", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+    return read_csv(SEED_PATH)
 
 
-def fetch_imd_rows() -> list[dict[str, str]]:
-    default_url = (
-        "https://assets.publishing.service.gov.uk/media/691ded56d140bbbaa59a2a7d/"
-        "File_7_IoD2025_All_Ranks_Scores_Deciles_Population_Denominators.csv"
-    )
-    source_url = os.getenv("IMD_SOURCE_URL", default_url).strip() or default_url
+def imd_source_url() -> str:
+    return os.getenv("IMD_SOURCE_URL", DEFAULT_IMD_URL).strip() or DEFAULT_IMD_URL
 
-    with urlopen(source_url, timeout=180) as response:
-        text = response.read().decode("utf-8")
 
-    rows = list(csv.DictReader(text.splitlines()))
+def load_validators(source_url: str) -> dict[str, str]:
+    """Conditional-request headers for the last successful fetch of this URL."""
+    if not VALIDATORS_PATH.exists():
+        return {}
+    try:
+        meta = json.loads(VALIDATORS_PATH.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(meta, dict) or meta.get("url") != source_url:
+        return {}
+    headers: dict[str, str] = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = str(meta["etag"])
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = str(meta["last_modified"])
+    return headers
+
+
+def save_validators(source_url: str, etag: str, last_modified: str) -> None:
+    if not etag and not last_modified:
+        VALIDATORS_PATH.unlink(missing_ok=True)
+        return
+    VALIDATORS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    meta = {"url": source_url, "etag": etag, "last_modified": last_modified}
+    VALIDATORS_PATH.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+
+def fetch_imd_rows(
+    source_url: str, validators: dict[str, str]
+) -> tuple[list[dict[str, str]] | None, tuple[str, str]]:
+    """Return the IMD rows and the response's (ETag, Last-Modified).
+
+    Rows are None when the server answers 304 to the conditional request.
+    """
     out: list[dict[str, str]] = []
 
     code_col = "LSOA code (2021)"
     decile_col = "Index of Multiple Deprivation (IMD) Decile (where 1 is most deprived 10% of LSOAs)"
 
-    for row in rows:
-        code = (row.get(code_col) or "").strip()
-        decile = (row.get(decile_col) or "").strip()
-        if not code or not decile:
-            continue
-        out.append({"area_code": f"LSOA::{code}", "imd_decile": decile})
-
-    return out
+    request = Request(source_url, headers=validators)
+    try:
+        response = urlopen(request, timeout=180)
+    except HTTPError as exc:
+        if exc.code == 304:
+            return None, ("", "")
+        raise
+
+    # Parse rows as they arrive rather than holding the whole file in memory.
+    with response:
+        etag = response.headers.get("ETag") or ""
+        last_modified = response.headers.get("Last-Modified") or ""
+        for row in csv.DictReader(io.TextIOWrapper(response, encoding="utf-8", newline="")):
+            code = (row.get(code_col) or "").strip()
+            decile = (row.get(decile_col) or "").strip()
+            if not code or not decile:
+                continue
+            out.append({"area_code": f"LSOA::{code}", "imd_decile": decile})
+
+    return out, (etag, last_modified)
 
 
 def normalize_postcode(value: str) -> str:
@@ -70,22 +138,26 @@ def build_postcode_lookup_rows() -> list[dict[str, str]]:
     if not PRACTICES_PATH.exists():
         return []
 
-    with PRACTICES_PATH.open("r", encoding="utf-8") as f:
-        rows = list(csv.DictReader(f))
+    rows = iter_csv_columns(PRACTICES_PATH, ["postcode", "lat", "lon", "area_code"])
 
+    # Bail out before normalising rows that cannot be used.
+    normalize = normalize_postcode
     dedup: dict[str, dict[str, str]] = {}
-    for row in rows:
-        postcode = normalize_postcode(str(row.get("postcode") or ""))
-        lat = str(row.get("lat") or "").strip()
-        lon = str(row.get("lon") or "").strip()
-        area_code = str(row.get("area_code") or "").strip()
-        if not postcode or not lat or not lon:
+    for raw_postcode, lat, lon, area_code in rows:
+        if not raw_postcode:
+            continue
+        lat = lat.strip()
+        lon = lon.strip()
+        if not lat or not lon:
+            continue
+        postcode = normalize(raw_postcode)
+        if not postcode:
             continue
         dedup[postcode] = {
             "postcode": postcode,
             "lat": lat,
             "lon": lon,
-            "area_code": area_code,
+            "area_code": area_code.strip(),
         }
 
     return list(dedup.values())
@@ -93,33 +165,41 @@ def build_postcode_lookup_rows() -> list[dict[str, str]]:
 
 def main() -> None:
     seed_rows = load_seed_rows()
-    existing_imd_rows = load_existing_imd_rows()
+    existing_imd_count = count_existing_imd_rows()
+    source_url = imd_source_url()
+    # Only revalidate when the existing file came from this source (seed writes drop the validators).
+    validators = load_validators(source_url) if existing_imd_count else {}
     try:
-        imd_rows = fetch_imd_rows()
-        if imd_rows:
-            write_csv(IMD_OUT, imd_rows, ["area_code", "imd_decile"])
+        imd_rows, (etag, last_modified) = fetch_imd_rows(source_url, validators)
+        if imd_rows is None:
+            print(f"IMD source unchanged; keeping existing {IMD_OUT} ({existing_imd_count} rows).")
+        elif imd_rows:
+            atomic_write_csv(IMD_OUT, ["area_code", "imd_decile"], imd_rows)
+            save_validators(source_url, etag, last_modified)
             print(f"Wrote {IMD_OUT} ({len(imd_rows)} rows, source=IoD 2025)")
         else:
-            if existing_imd_rows:
+            if existing_imd_count:
                 print(
-                    f"IMD source returned no rows; keeping existing {IMD_OUT} ({len(existing_imd_rows)} rows)."
+                    f"IMD source returned no rows; keeping existing {IMD_OUT} ({existing_imd_count} rows)."
                 )
             else:
-                write_csv(IMD_OUT, seed_rows, ["area_code", "imd_decile"])
+                atomic_write_csv(IMD_OUT, ["area_code", "imd_decile"], seed_rows)
+                VALIDATORS_PATH.unlink(missing_ok=True)
                 print("IMD source returned no rows and no existing file; wrote seed fallback.")
     except URLError as exc:
-        if existing_imd_rows:
-            print(f"IMD fetch failed ({exc}); keeping existing {IMD_OUT} ({len(existing_imd_rows)} rows).")
+        if existing_imd_count:
+            print(f"IMD fetch failed ({exc}); keeping existing {IMD_OUT} ({existing_imd_count} rows).")
         else:
-            write_csv(IMD_OUT, seed_rows, ["area_code", "imd_decile"])
+            atomic_write_csv(IMD_OUT, ["area_code", "imd_decile"], seed_rows)
+            VALIDATORS_PATH.unlink(missing_ok=True)
             print(f"IMD fetch failed ({exc}) and no existing file; wrote seed fallback.")
 
     postcode_rows = build_postcode_lookup_rows()
     if postcode_rows:
-        write_csv(POSTCODE_OUT, postcode_rows, ["postcode", "lat", "lon", "area_code"])
+        atomic_write_csv(POSTCODE_OUT, ["postcode", "lat", "lon", "area_code"], postcode_rows)
         print(f"Wrote {POSTCODE_OUT} ({len(postcode_rows)} rows, source=practices)")
     else:
-        write_csv(POSTCODE_OUT, [], ["postcode", "lat", "lon", "area_code"])
+        atomic_write_csv(POSTCODE_OUT, ["postcode", "lat", "lon", "area_code"], [])
         print(f"Wrote {POSTCODE_OUT} (0 rows, source=empty)")
 
 
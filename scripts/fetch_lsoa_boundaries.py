@@ -9,7 +9,25 @@ import json
 import os
 from urllib.request import Request, urlopen
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
 OUT = Path("data/raw/lsoa_boundaries.geojson")
+PROPERTIES_OUT = Path("data/raw/lsoa_properties.json")
+
+
+def lsoa_code_names(features: list[dict]) -> dict[str, str]:
+    """Map LSOA code -> name; enough for consumers that never touch geometry."""
+    out: dict[str, str] = {}
+    for feature in features:
+        props = feature.get("properties") or {}
+        code = str(props.get("LSOA21CD") or props.get("LSOA11CD") or "").strip()
+        name = str(props.get("LSOA21NM") or props.get("LSOA11NM") or "").strip()
+        if code:
+            out[code] = name
+    return out
 
 
 def main() -> None:
@@ -25,13 +43,24 @@ def main() -> None:
     if source_url.endswith(".gz"):
         raw = gzip.decompress(raw)
 
-    payload = json.loads(raw.decode("utf-8"))
+    payload = orjson.loads(raw) if orjson is not None else json.loads(raw)
     if payload.get("type") != "FeatureCollection":
         raise RuntimeError("LSOA boundary source is not a GeoJSON FeatureCollection")
 
     OUT.parent.mkdir(parents=True, exist_ok=True)
-    OUT.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
-    print(f"Wrote {OUT} ({len(payload.get('features', []))} features)")
+    if b"\n " not in raw[:4096]:
+        # Already compact (or one feature per line); re-encoding would only cost time.
+        OUT.write_bytes(raw)
+    elif orjson is not None:
+        OUT.write_bytes(orjson.dumps(payload))
+    else:
+        OUT.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+    code_names = lsoa_code_names(payload.get("features", []))
+    if orjson is not None:
+        PROPERTIES_OUT.write_bytes(orjson.dumps(code_names))
+    else:
+        PROPERTIES_OUT.write_text(json.dumps(code_names, separators=(",", ":")), encoding="utf-8")
+    print(f"Wrote {OUT} ({len(payload.get('features', []))} features) and {PROPERTIES_OUT}")
 
 
 if __name__ == "__main__":
@@ -3,8 +3,11 @@
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable, Iterator
 import csv
+import io
 import os
 import json
 import re
@@ -12,51 +15,105 @@ from urllib.error import URLError
 from urllib.parse import urlencode
 from urllib.request import urlopen
 
+from atomic_csv import atomic_write_csv
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional accelerator
+    ijson = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
 OUT = Path("data/raw/population.csv")
 PRACTICES_PATH = Path("data/raw/practices.csv")
 LSOA_BOUNDARIES_PATH = Path("data/raw/lsoa_boundaries.geojson")
+LSOA_PROPERTIES_PATH = Path("data/raw/lsoa_properties.json")
 SEED_PATH = Path("data/seed/population.csv")
 LSOA_CODE_RE = re.compile(r"^[EW]010\d{5}$")
-
-
-def load_existing_rows() -> list[dict[str, str]]:
-    if not OUT.exists():
-        return []
-    with OUT.open("r", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+NOMIS_BASE_URL = "https://www.nomisweb.co.uk/api/v01/dataset/NM_2014_1.data.csv"
+NOMIS_WORKERS = 8
+NOMIS_AGE_FIELDS = {
+    "200": "population_total",  # All ages
+    "201": "population_children",  # 0-15
+    "202": "population_adults",  # 16+
+}
+POPULATION_FIELDS = [
+    "area_code",
+    "area_name",
+    "population_total",
+    "population_adults",
+    "population_children",
+]
+
+
+def read_csv(path: Path) -> list[dict[str, str]]:
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return []
+        return [dict(zip(header, row)) for row in reader if row]
+
+
+def iter_csv_columns(path: Path, columns: list[str]) -> Iterator[tuple[str, ...]]:
+    """Stream only the named columns, as tuples in the given order ("" when absent)."""
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        index = {name: i for i, name in enumerate(header)}
+        positions = [index.get(name, -1) for name in columns]
+        for row in reader:
+            if not row:
+                continue
+            width = len(row)
+            yield tuple(row[i] if 0 <= i < width else "" for i in positions)
 
 
 def load_seed_rows() -> list[dict[str, str]]:
     if not SEED_PATH.exists():
         raise FileNotFoundError(f"Seed file not found: {SEED_PATH}")
-    with SEED_PATH.open("r", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
-
+    return read_csv(SEED_PATH)
 
-def looks_like_seed(rows: list[dict[str, str]], seed_rows: list[dict[str, str]]) -> bool:
-    if len(rows) != len(seed_rows):
-        return False
-    keys = {"area_code", "area_name", "population_total", "population_adults", "population_children"}
-    return all(set(r.keys()) == keys for r in rows) and {r["area_code"] for r in rows} == {
-        r["area_code"] for r in seed_rows
-    }
 
+def summarize_existing_rows(seed_rows: list[dict[str, str]]) -> tuple[int, bool]:
+    """Stream the existing output once; return (row count, whether it is non-seed data).
 
-def write_rows(rows: list[dict[str, str]]) -> None:
-    OUT.parent.mkdir(parents=True, exist_ok=True)
-    with OUT.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "area_code",
-                "area_name",
-                "population_total",
-                "population_adults",
-                "population_children",
-            ],
-        )
-        writer.writeheader()
-        writer.writerows(rows)
+    Existing rows count as seed when they have exactly the population columns
+    and the same set of area codes as the seed file.
+    """
+    if not OUT.exists():
+        return 0, False
+    with OUT.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return 0, False
+        seed_shaped = set(header) == set(POPULATION_FIELDS)
+        area_index = header.index("area_code") if seed_shaped else -1
+        width = len(header)
+        count = 0
+        area_codes = set()
+        for row in reader:
+            if not row:
+                continue
+            count += 1
+            if seed_shaped:
+                # Like csv.DictReader: short rows are padded, extra fields add a key.
+                if len(row) > width:
+                    seed_shaped = False
+                else:
+                    area_codes.add(row[area_index] if area_index < len(row) else None)
+    looks_like_seed = (
+        seed_shaped
+        and count == len(seed_rows)
+        and area_codes == {r["area_code"] for r in seed_rows}
+    )
+    return count, count > 0 and not looks_like_seed
 
 
 def chunked(items: list[str], size: int) -> list[list[str]]:
@@ -66,12 +123,9 @@ def chunked(items: list[str], size: int) -> list[list[str]]:
 def load_practice_lsoa_codes() -> list[str]:
     if not PRACTICES_PATH.exists():
         return []
-    with PRACTICES_PATH.open("r", encoding="utf-8") as f:
-        rows = list(csv.DictReader(f))
-
     codes = set()
-    for row in rows:
-        area = (row.get("area_code") or "").strip()
+    for (area,) in iter_csv_columns(PRACTICES_PATH, ["area_code"]):
+        area = area.strip()
         if not area.startswith("LSOA::"):
             continue
         code = area.replace("LSOA::", "", 1).strip()
@@ -81,106 +135,135 @@ def load_practice_lsoa_codes() -> list[str]:
     return sorted(codes)
 
 
-def load_all_lsoa_codes_from_boundaries() -> list[str]:
+def read_json(path: Path) -> object:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def iter_boundary_properties(path: Path) -> Iterator[object]:
+    """Yield each feature's properties; with ijson, geometries are never built."""
+    if ijson is not None:
+        with path.open("rb") as f:
+            yield from ijson.items(f, "features.item.properties", use_float=True)
+        return
+    payload = read_json(path)
+    for feature in payload.get("features", []):
+        yield feature.get("properties", {})
+
+
+def iter_lsoa_code_names() -> Iterator[tuple[str, str]]:
+    """Yield (code, name) per LSOA, preferring the properties sidecar when current.
+
+    fetch_lsoa_boundaries.py writes the sidecar next to the boundaries; it is
+    ignored if the GeoJSON has been replaced since.
+    """
+    if LSOA_PROPERTIES_PATH.exists() and (
+        not LSOA_BOUNDARIES_PATH.exists()
+        or LSOA_PROPERTIES_PATH.stat().st_mtime >= LSOA_BOUNDARIES_PATH.stat().st_mtime
+    ):
+        payload = read_json(LSOA_PROPERTIES_PATH)
+        if isinstance(payload, dict):
+            for code, name in payload.items():
+                yield str(code), str(name or "")
+            return
     if not LSOA_BOUNDARIES_PATH.exists():
-        return []
-    payload = json.loads(LSOA_BOUNDARIES_PATH.read_text(encoding="utf-8"))
-    features = payload.get("features", [])
-    out = set()
-    for feature in features:
-        props = feature.get("properties", {})
+        return
+    for props in iter_boundary_properties(LSOA_BOUNDARIES_PATH):
         if not isinstance(props, dict):
             continue
         code = str(props.get("LSOA21CD") or props.get("LSOA11CD") or "").strip()
+        name = str(props.get("LSOA21NM") or props.get("LSOA11NM") or "").strip()
+        yield code, name
+
+
+def load_all_lsoa_codes_from_boundaries() -> list[str]:
+    out = set()
+    for code, _name in iter_lsoa_code_names():
         if LSOA_CODE_RE.match(code):
             out.add(code)
     return sorted(out)
 
 
-def fetch_nomis_population_for_codes(lsoa_codes: list[str]) -> list[dict[str, str]]:
-    base = "https://www.nomisweb.co.uk/api/v01/dataset/NM_2014_1.data.csv"
-    by_lsoa: dict[str, dict[str, str]] = {}
-
-    for batch in chunked(lsoa_codes, 150):
-        params = {
-            "date": "latest",
-            "geography": ",".join(batch),
-            "gender": "0",  # Total
-            "c_age": "200,201,202",  # All ages, 0-15, 16+
-            "measures": "20100",  # Value
-        }
-        url = f"{base}?{urlencode(params)}"
-        with urlopen(url, timeout=180) as response:
-            lines = response.read().decode("utf-8").splitlines()
-
-        reader = csv.DictReader(lines)
-        for row in reader:
-            lsoa_code = (row.get("GEOGRAPHY_CODE") or "").strip()
-            lsoa_name = (row.get("GEOGRAPHY_NAME") or "").strip()
-            age_code = (row.get("C_AGE") or "").strip()
-            obs_value = (row.get("OBS_VALUE") or "").strip()
-            if not lsoa_code or not age_code or not obs_value:
-                continue
-
-            item = by_lsoa.setdefault(
-                lsoa_code,
-                {
-                    "area_code": f"LSOA::{lsoa_code}",
-                    "area_name": lsoa_name or lsoa_code,
-                    "population_total": "0",
-                    "population_adults": "0",
-                    "population_children": "0",
-                },
-            )
-
-            if age_code == "200":
-                item["population_total"] = obs_value
-            elif age_code == "201":
-                item["population_children"] = obs_value
-            elif age_code == "202":
-                item["population_adults"] = obs_value
-
-    return list(by_lsoa.values())
-
-
-def fetch_nomis_population_for_geography(geography: str) -> list[dict[str, str]]:
-    base = "https://www.nomisweb.co.uk/api/v01/dataset/NM_2014_1.data.csv"
+def nomis_url(geography: str) -> str:
     params = {
         "date": "latest",
         "geography": geography,
-        "gender": "0",
-        "c_age": "200,201,202",
-        "measures": "20100",
+        "gender": "0",  # Total
+        "c_age": "200,201,202",  # All ages, 0-15, 16+
+        "measures": "20100",  # Value
     }
-    url = f"{base}?{urlencode(params)}"
-    with urlopen(url, timeout=300) as response:
-        lines = response.read().decode("utf-8").splitlines()
+    return f"{NOMIS_BASE_URL}?{urlencode(params)}"
 
-    by_lsoa: dict[str, dict[str, str]] = {}
-    reader = csv.DictReader(lines)
+
+def iter_nomis_rows(response: io.BufferedIOBase) -> Iterator[tuple[str, str, str, str]]:
+    """Yield (code, name, age, value) per usable row, parsing the response as it streams."""
+    reader = csv.reader(io.TextIOWrapper(response, encoding="utf-8", newline=""))
+    header = next(reader, None)
+    if header is None:
+        return
+    index = {name: i for i, name in enumerate(header)}
+    columns = ("GEOGRAPHY_CODE", "GEOGRAPHY_NAME", "C_AGE", "OBS_VALUE")
+    positions = [index.get(name, -1) for name in columns]
     for row in reader:
-        lsoa_code = (row.get("GEOGRAPHY_CODE") or "").strip()
-        lsoa_name = (row.get("GEOGRAPHY_NAME") or "").strip()
-        age_code = (row.get("C_AGE") or "").strip()
-        obs_value = (row.get("OBS_VALUE") or "").strip()
+        width = len(row)
+        lsoa_code, lsoa_name, age_code, obs_value = (
+            row[i].strip() if 0 <= i < width else "" for i in positions
+        )
         if not lsoa_code or not age_code or not obs_value:
             continue
-        item = by_lsoa.setdefault(
-            lsoa_code,
-            {
-                "area_code": f"LSOA::{lsoa_code}",
+        yield lsoa_code, lsoa_name, age_code, obs_value
+
+
+def fetch_nomis_rows(url: str, timeout: int) -> list[tuple[str, str, str, str]]:
+    with urlopen(url, timeout=timeout) as response:
+        return list(iter_nomis_rows(response))
+
+
+def merge_nomis_rows(
+    by_lsoa: dict[str, dict[str, str]], rows: Iterable[tuple[str, str, str, str]]
+) -> None:
+    age_field = NOMIS_AGE_FIELDS.get
+    for lsoa_code, lsoa_name, age_code, obs_value in rows:
+        # Look up first: most rows hit an existing LSOA, so skip building the default.
+        item = by_lsoa.get(lsoa_code)
+        if item is None:
+            item = by_lsoa[lsoa_code] = {
+                "area_code": "LSOA::" + lsoa_code,
                 "area_name": lsoa_name or lsoa_code,
                 "population_total": "0",
                 "population_adults": "0",
                 "population_children": "0",
-            },
-        )
-        if age_code == "200":
-            item["population_total"] = obs_value
-        elif age_code == "201":
-            item["population_children"] = obs_value
-        elif age_code == "202":
-            item["population_adults"] = obs_value
+            }
+
+        field = age_field(age_code)
+        if field is not None:
+            item[field] = obs_value
+
+
+def fetch_nomis_population_for_codes(lsoa_codes: list[str]) -> list[dict[str, str]]:
+    by_lsoa: dict[str, dict[str, str]] = {}
+    urls = [nomis_url(",".join(batch)) for batch in chunked(lsoa_codes, 150)]
+    if not urls:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(NOMIS_WORKERS, len(urls))) as executor:
+        futures = [executor.submit(fetch_nomis_rows, url, 180) for url in urls]
+        # Merge in batch order; on the first failure drop queued batches and re-raise.
+        try:
+            for future in futures:
+                merge_nomis_rows(by_lsoa, future.result())
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    return list(by_lsoa.values())
+
+
+def fetch_nomis_population_for_geography(geography: str) -> list[dict[str, str]]:
+    by_lsoa: dict[str, dict[str, str]] = {}
+    with urlopen(nomis_url(geography), timeout=300) as response:
+        merge_nomis_rows(by_lsoa, iter_nomis_rows(response))
     return list(by_lsoa.values())
 
 
@@ -198,14 +281,14 @@ def rows_look_like_lsoa(rows: list[dict[str, str]]) -> bool:
 
 def main() -> None:
     seed_rows = load_seed_rows()
-    existing_rows = load_existing_rows()
+    existing_count, existing_is_real = summarize_existing_rows(seed_rows)
     full_geography = os.getenv("NOMIS_POPULATION_GEOGRAPHY", "").strip()
     if full_geography:
         try:
             rows = fetch_nomis_population_for_geography(full_geography)
             if rows:
                 if rows_look_like_lsoa(rows):
-                    write_rows(rows)
+                    atomic_write_csv(OUT, POPULATION_FIELDS, rows)
                     print(
                         f"Wrote {OUT} ({len(rows)} rows, source=nomis NM_2014_1 geography={full_geography})"
                     )
@@ -217,8 +300,8 @@ def main() -> None:
                 print("Nomis full-geography query returned zero rows; falling back.")
         except URLError as exc:
             print(f"Nomis full-geography fetch failed ({exc}); falling back.")
-            if existing_rows and not looks_like_seed(existing_rows, seed_rows):
-                print(f"Keeping existing {OUT} ({len(existing_rows)} rows) because existing data is non-seed.")
+            if existing_is_real:
+                print(f"Keeping existing {OUT} ({existing_count} rows) because existing data is non-seed.")
                 return
 
     all_lsoa_codes = load_all_lsoa_codes_from_boundaries()
@@ -226,7 +309,7 @@ def main() -> None:
         try:
             rows = fetch_nomis_population_for_codes(all_lsoa_codes)
             if rows and rows_look_like_lsoa(rows):
-                write_rows(rows)
+                atomic_write_csv(OUT, POPULATION_FIELDS, rows)
                 print(
                     f"Wrote {OUT} ({len(rows)} rows, source=nomis NM_2014_1 via all LSOA boundary codes={len(all_lsoa_codes)})"
                 )
@@ -234,25 +317,25 @@ def main() -> None:
             print("Boundary-code population query returned no usable LSOA rows; falling back.")
         except URLError as exc:
             print(f"Boundary-code population fetch failed ({exc}); falling back.")
-            if existing_rows and not looks_like_seed(existing_rows, seed_rows):
-                print(f"Keeping existing {OUT} ({len(existing_rows)} rows) because existing data is non-seed.")
+            if existing_is_real:
+                print(f"Keeping existing {OUT} ({existing_count} rows) because existing data is non-seed.")
                 return
 
     lsoa_codes = load_practice_lsoa_codes()
     if not lsoa_codes:
-        if existing_rows and not looks_like_seed(existing_rows, seed_rows):
+        if existing_is_real:
             print(
-                f"No LSOA codes found in practices; keeping existing {OUT} ({len(existing_rows)} rows)."
+                f"No LSOA codes found in practices; keeping existing {OUT} ({existing_count} rows)."
             )
             return
-        write_rows(seed_rows)
+        atomic_write_csv(OUT, POPULATION_FIELDS, seed_rows)
         print("No LSOA codes found in practices; wrote seed population fallback.")
         return
 
     try:
         rows = fetch_nomis_population_for_codes(lsoa_codes)
         if rows:
-            write_rows(rows)
+            atomic_write_csv(OUT, POPULATION_FIELDS, rows)
             print(
                 f"Wrote {OUT} ({len(rows)} rows, source=nomis NM_2014_1 targeted, requested_lsoas={len(lsoa_codes)})"
             )
@@ -260,11 +343,11 @@ def main() -> None:
         print("Nomis population query returned zero rows; falling back to seed data.")
     except URLError as exc:
         print(f"Nomis population fetch failed ({exc}); falling back to seed data.")
-        if existing_rows and not looks_like_seed(existing_rows, seed_rows):
-            print(f"Keeping existing {OUT} ({len(existing_rows)} rows) because existing data is non-seed.")
+        if existing_is_real:
+            print(f"Keeping existing {OUT} ({existing_count} rows) because existing data is non-seed.")
             return
 
-    write_rows(seed_rows)
+    atomic_write_csv(OUT, POPULATION_FIELDS, seed_rows)
     print(f"Wrote {OUT} ({len(seed_rows)} rows, source=seed)")
 
 
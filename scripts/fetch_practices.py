@@ -7,6 +7,7 @@ from pathlib import Path
 import csv
 import os
 
+from atomic_csv import atomic_write_csv
 from nhs_live import (
     fetch_nhs_service_search_pages,
     normalize_nhs_records,
@@ -17,31 +18,35 @@ OUT = Path("data/raw/practices.csv")
 NORMALIZED_SNAPSHOT = Path("data/raw/nhs_practices_normalized.json")
 SEED_PATH = Path("data/seed/practices.csv")
 
+FIELDS = (
+    "practice_id",
+    "practice_name",
+    "address",
+    "postcode",
+    "lat",
+    "lon",
+    "area_code",
+)
 
-def write_csv(rows: list[dict[str, str]]) -> None:
-    OUT.parent.mkdir(parents=True, exist_ok=True)
-    with OUT.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "practice_id",
-                "practice_name",
-                "address",
-                "postcode",
-                "lat",
-                "lon",
-                "area_code",
-            ],
-        )
-        writer.writeheader()
-        writer.writerows(rows)
-
-
-def load_existing_rows() -> list[dict[str, str]]:
-    if not OUT.exists():
-        return []
-    with OUT.open("r", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
+
+def summarize_practice_names(path: Path) -> tuple[int, set[str]]:
+    """Stream a practices CSV once; return (row count, set of stripped practice names)."""
+    if not path.exists():
+        return 0, set()
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return 0, set()
+        name_index = header.index("practice_name") if "practice_name" in header else -1
+        count = 0
+        names = set()
+        for row in reader:
+            if not row:
+                continue
+            count += 1
+            names.add(row[name_index].strip() if 0 <= name_index < len(row) else "")
+    return count, names
 
 
 def load_seed_rows() -> list[dict[str, str]]:
@@ -51,18 +56,14 @@ def load_seed_rows() -> list[dict[str, str]]:
         return list(csv.DictReader(f))
 
 
-def looks_like_seed(rows: list[dict[str, str]], seed_rows: list[dict[str, str]]) -> bool:
-    if len(rows) != len(seed_rows):
-        return False
-    names = {r.get("practice_name", "").strip() for r in rows}
-    seed_names = {r.get("practice_name", "").strip() for r in seed_rows}
-    return names == seed_names
+def looks_like_seed(count: int, names: set[str]) -> bool:
+    if not SEED_PATH.exists():
+        raise FileNotFoundError(f"Seed file not found: {SEED_PATH}")
+    return (count, names) == summarize_practice_names(SEED_PATH)
 
 
 def main() -> None:
-    seed_rows = load_seed_rows()
     use_live = bool(os.getenv("NHS_API_SUBSCRIPTION_KEY", "").strip())
-    existing_rows = load_existing_rows()
 
     if use_live:
         try:
@@ -70,35 +71,29 @@ def main() -> None:
             normalized = normalize_nhs_records(items)
             if normalized:
                 write_normalized_snapshot(normalized)
-                rows = [
-                    {
-                        "practice_id": row["practice_id"],
-                        "practice_name": row["practice_name"],
-                        "address": row["address"],
-                        "postcode": row["postcode"],
-                        "lat": row.get("lat", ""),
-                        "lon": row.get("lon", ""),
-                        "area_code": row.get("area_code", ""),
-                    }
-                    for row in normalized
-                ]
-                write_csv(rows)
-                print(f"Wrote {OUT} ({len(rows)} rows, source=nhs-api)")
+                # Only the FIELDS columns are written, so the normalized rows go in as-is.
+                atomic_write_csv(OUT, FIELDS, normalized)
+                print(f"Wrote {OUT} ({len(normalized)} rows, source=nhs-api)")
                 return
 
             print("NHS API returned no normalized dental records; falling back to seed rows.")
         except Exception as exc:  # pragma: no cover
             print(f"Live NHS fetch failed ({exc}); falling back to seed rows.")
 
+    # Seed and existing rows are only needed once the live fetch has not produced data.
+    if use_live:
+        # Only the row count and practice names are compared, so neither file is loaded in full.
+        existing_count, existing_names = summarize_practice_names(OUT)
         # Safety: do not wipe existing real data with 5-row seed fallback.
-        if existing_rows and not looks_like_seed(existing_rows, seed_rows):
+        if existing_count and not looks_like_seed(existing_count, existing_names):
             print(
-                f"Keeping existing {OUT} ({len(existing_rows)} rows) because live fetch failed and existing data is non-seed."
+                f"Keeping existing {OUT} ({existing_count} rows) because live fetch failed and existing data is non-seed."
             )
             return
 
+    seed_rows = load_seed_rows()
     write_normalized_snapshot([])
-    write_csv(seed_rows)
+    atomic_write_csv(OUT, FIELDS, seed_rows)
     print(f"Wrote {OUT} ({len(seed_rows)} rows, source=seed)")
 
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Keep-alive HTTP client shared by the pipeline's API fetchers."""
+
+from __future__ import annotations
+
+import http.client
+import io
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request, getproxies, proxy_bypass, urlopen
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 10
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+def _uses_proxy(url: str) -> bool:
+    parts = urlsplit(url)
+    if not getproxies().get(parts.scheme):
+        return False
+    return not (parts.netloc and proxy_bypass(parts.netloc))
+
+
+class KeepAliveClient:
+    """Reuse one connection per origin across requests, skipping repeated TCP/TLS handshakes.
+
+    Behaves like urlopen where the pipeline relies on it: redirects are
+    followed with urllib's rules, non-2xx responses raise HTTPError and
+    transport failures raise URLError. When a proxy applies to a URL (the
+    scheme has one and no_proxy does not exclude the host, as urllib's
+    ProxyHandler decides) the request goes through urlopen instead, since
+    http.client ignores proxy settings.
+    A client is not thread-safe; give each thread its own and close() it.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self._connections: dict[str, http.client.HTTPConnection] = {}
+
+    def __enter__(self) -> KeepAliveClient:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[bytes, http.client.HTTPMessage]:
+        """Return the body and headers of the final (2xx) response."""
+        headers = dict(headers or {})
+        redirects = 0
+        while True:
+            if _uses_proxy(url):
+                # urlopen follows any further redirects itself.
+                request = Request(url, data=body, method=method, headers=headers)
+                with urlopen(request, timeout=self.timeout) as response:
+                    return response.read(), response.headers
+            status, reason, message, data = self._send(method, url, body, headers)
+            location = message.get("Location")
+            if status in REDIRECT_STATUSES and location:
+                target = urljoin(url, location)
+                # Same rules as urllib's redirect handler: GET/HEAD follow any redirect,
+                # POST only 301/302/303 and continues as a body-less GET.
+                followable = method in ("GET", "HEAD") or status in (301, 302, 303)
+                if (
+                    redirects == MAX_REDIRECTS
+                    or not followable
+                    or urlsplit(target).scheme not in ("http", "https")
+                ):
+                    raise HTTPError(url, status, reason, message, io.BytesIO(data))
+                if method not in ("GET", "HEAD"):
+                    method, body = "GET", None
+                    headers = {
+                        key: value
+                        for key, value in headers.items()
+                        if key.lower() not in ("content-length", "content-type")
+                    }
+                url = target
+                redirects += 1
+                continue
+            if not 200 <= status < 300:
+                raise HTTPError(url, status, reason, message, io.BytesIO(data))
+            return data, message
+
+    def _send(
+        self, method: str, url: str, body: bytes | None, headers: dict[str, str]
+    ) -> tuple[int, str, http.client.HTTPMessage, bytes]:
+        parts = urlsplit(url)
+        reused = f"{parts.scheme}://{parts.netloc}" in self._connections
+        try:
+            try:
+                return self._send_once(method, url, body, headers)
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # The server closed the idle connection; retry once on a fresh one.
+                return self._send_once(method, url, body, headers)
+        except (http.client.HTTPException, OSError) as exc:
+            raise URLError(exc) from exc
+
+    def _send_once(
+        self, method: str, url: str, body: bytes | None, headers: dict[str, str]
+    ) -> tuple[int, str, http.client.HTTPMessage, bytes]:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        conn = self._connections.get(origin)
+        if conn is None:
+            if parts.scheme == "https":
+                conn = http.client.HTTPSConnection(parts.netloc, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(parts.netloc, timeout=self.timeout)
+            self._connections[origin] = conn
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        try:
+            conn.request(method, target, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.reason, response.headers, response.read()
+        except BaseException:
+            conn.close()
+            del self._connections[origin]
+            raise
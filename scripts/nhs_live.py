@@ -5,20 +5,95 @@ from __future__ import annotations
 
 from datetime import date
 from pathlib import Path
-from typing import Any
+from itertools import islice
+from typing import Any, Iterable, Iterator
+import gzip
 import hashlib
 import json
 import os
 import re
+import sys
 from urllib.error import HTTPError
 from urllib.parse import urlencode
-from urllib.request import Request, urlopen
 
-RAW_RESPONSE_PATH = Path("data/raw/nhs_service_search.json")
+from keepalive_http import KeepAliveClient
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+RAW_RESPONSE_PATH = Path("data/raw/nhs_service_search.jsonl")
 NORMALIZED_PATH = Path("data/raw/nhs_practices_normalized.json")
+ETAGS_PATH = Path("data/raw/nhs_etags.json")
 
 BOOL_TRUE = {"yes", "true", "1", "y"}
 BOOL_FALSE = {"no", "false", "0", "n"}
+# Exact spellings resolved with one lookup before the substring fallback.
+YES_NO_ANSWERS = {**dict.fromkeys(BOOL_TRUE, "yes"), **dict.fromkeys(BOOL_FALSE, "no")}
+
+ADULT_AVAILABILITY_KEYS = (
+    "accepting_adults",
+    "acceptingAdults",
+    "AcceptingAdults",
+    "accepting_new_adult_patients",
+    "acceptingAdultNhsPatients",
+    "AcceptingNewNHSAdultPatients",
+)
+CHILD_AVAILABILITY_KEYS = (
+    "accepting_children",
+    "acceptingChildren",
+    "AcceptingChildren",
+    "accepting_new_child_patients",
+    "acceptingChildNhsPatients",
+    "AcceptingNewNHSChildPatients",
+)
+# Alternative spellings for the other per-record fields, built once for _first.
+ORG_TYPE_ID_KEYS = ("OrganisationTypeId", "organisationTypeId")
+ORG_TYPE_KEYS = ("OrganisationType", "organisationType")
+NAME_KEYS = ("practice_name", "name", "Name", "OrganisationName", "organisationName")
+PRACTICE_ID_KEYS = (
+    "practice_id",
+    "id",
+    "ID",
+    "OrganisationID",
+    "organisationID",
+    "ODSCode",
+    "odsCode",
+)
+POSTCODE_KEYS = ("postcode", "Postcode", "postalCode", "PostalCode")
+POSTCODE_VALUE_KEYS = ("value", "postcode", "Postcode")
+ADDRESS_KEYS = ("address", "Address")
+NESTED_ADDRESS_PART_KEYS = (
+    ("line1", "Line1", "addressLine1", "AddressLine1"),
+    ("line2", "Line2", "addressLine2", "AddressLine2"),
+    ("city", "City", "town", "Town"),
+)
+FLAT_ADDRESS_PART_KEYS = (
+    ("Address1", "address1"),
+    ("Address2", "address2"),
+    ("Address3", "address3"),
+    ("City", "city", "Town", "town"),
+)
+LATITUDE_KEYS = ("Latitude", "latitude")
+LONGITUDE_KEYS = ("Longitude", "longitude")
+COUNTY_KEYS = ("County", "county")
+
+ADULT_AVAILABILITY_RE = re.compile(r"adult[^.\n]{0,40}\b(yes|no)\b")
+CHILD_AVAILABILITY_RE = re.compile(r"child[^.\n]{0,40}\b(yes|no)\b")
+
+
+def _dumps_json(obj: Any) -> bytes:
+    """Compact JSON for the snapshot files, newline-terminated."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _loads_json(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 def _extract_result_items(payload: Any) -> list[dict[str, Any]]:
@@ -36,51 +111,67 @@ def _extract_result_items(payload: Any) -> list[dict[str, Any]]:
     return []
 
 
+def _iter_strings(value: Any) -> Iterator[str]:
+    """Yield every string in a decoded JSON value, depth-first in document order."""
+    # A stack of iterators rather than recursion: no call per nested value, no
+    # intermediate lists, and the order matches a recursive walk.
+    stack = [iter((value,))]
+    while stack:
+        for v in stack[-1]:
+            kind = type(v)  # decoded JSON only holds exact dict/list/str
+            if kind is str:
+                yield v
+            elif kind is dict:
+                stack.append(iter(v.values()))
+                break
+            elif kind is list:
+                stack.append(iter(v))
+                break
+        else:
+            stack.pop()
+
+
 def _iter_string_values(value: Any) -> list[str]:
-    out: list[str] = []
-    if isinstance(value, str):
-        out.append(value)
-    elif isinstance(value, dict):
-        for v in value.values():
-            out.extend(_iter_string_values(v))
-    elif isinstance(value, list):
-        for v in value:
-            out.extend(_iter_string_values(v))
-    return out
-
-
-def _pick(record: dict[str, Any], *keys: str) -> Any:
+    return list(_iter_strings(value))
+
+
+def _first(record: dict[str, Any], keys: tuple[str, ...]) -> Any:
+    """Value of the first key that is present and not None or ""; takes a prebuilt tuple."""
     for key in keys:
-        if key in record and record[key] not in (None, ""):
-            return record[key]
+        value = record.get(key)
+        if value is not None and value != "":
+            return value
     return None
 
 
 def _normalize_postcode(postcode: str) -> str:
-    return re.sub(r"\s+", "", postcode.strip().upper())
+    # str.split() breaks on the same characters as \s, without going through the regex engine.
+    return "".join(postcode.upper().split())
 
 
 def _looks_like_dental(record: dict[str, Any]) -> bool:
-    org_type_id = _pick(record, "OrganisationTypeId", "organisationTypeId")
+    org_type_id = _first(record, ORG_TYPE_ID_KEYS)
     if isinstance(org_type_id, str) and org_type_id.strip().upper() == "DEN":
         return True
-    org_type = _pick(record, "OrganisationType", "organisationType")
+    org_type = _first(record, ORG_TYPE_KEYS)
     if isinstance(org_type, str) and "dent" in org_type.lower():
         return True
-    text_blob = " ".join(_iter_string_values(record)).lower()
-    return "dent" in text_blob
+    # Equivalent to searching the joined text blob ("dent" cannot span the
+    # separators), but stops at the first hit and never builds the blob.
+    return any("dent" in text.lower() for text in _iter_strings(record))
 
 
 def _normalize_yes_no_unknown(value: Any) -> str:
-    if isinstance(value, bool):
-        return "yes" if value else "no"
     if value is None:
         return "unknown"
-    text = str(value).strip().lower()
-    if text in BOOL_TRUE:
+    if value is True:
         return "yes"
-    if text in BOOL_FALSE:
+    if value is False:
         return "no"
+    text = str(value).strip().lower()
+    answer = YES_NO_ANSWERS.get(text)
+    if answer is not None:
+        return answer
     if "yes" in text:
         return "yes"
     if "no" in text:
@@ -107,67 +198,42 @@ def _availability_from_record(record: dict[str, Any]) -> tuple[str, str]:
             if adults != "unknown" or children != "unknown":
                 return adults, children
 
-    adults = _normalize_yes_no_unknown(
-        _pick(
-            record,
-            "accepting_adults",
-            "acceptingAdults",
-            "AcceptingAdults",
-            "accepting_new_adult_patients",
-            "acceptingAdultNhsPatients",
-            "AcceptingNewNHSAdultPatients",
-        )
-    )
-    children = _normalize_yes_no_unknown(
-        _pick(
-            record,
-            "accepting_children",
-            "acceptingChildren",
-            "AcceptingChildren",
-            "accepting_new_child_patients",
-            "acceptingChildNhsPatients",
-            "AcceptingNewNHSChildPatients",
-        )
-    )
+    adults = _normalize_yes_no_unknown(_first(record, ADULT_AVAILABILITY_KEYS))
+    children = _normalize_yes_no_unknown(_first(record, CHILD_AVAILABILITY_KEYS))
 
     if adults != "unknown" or children != "unknown":
         return adults, children
 
     text_blob = " ".join(_iter_string_values(record)).lower()
 
-    adult_match = re.search(r"adult[^.\n]{0,40}\b(yes|no)\b", text_blob)
-    child_match = re.search(r"child[^.\n]{0,40}\b(yes|no)\b", text_blob)
-
-    if adult_match:
-        adults = "yes" if adult_match.group(1) == "yes" else "no"
-    if child_match:
-        children = "yes" if child_match.group(1) == "yes" else "no"
+    # Most blobs mention neither word; a substring test is cheaper than starting the regex.
+    if "adult" in text_blob:
+        adult_match = ADULT_AVAILABILITY_RE.search(text_blob)
+        if adult_match:
+            adults = "yes" if adult_match.group(1) == "yes" else "no"
+    if "child" in text_blob:
+        child_match = CHILD_AVAILABILITY_RE.search(text_blob)
+        if child_match:
+            children = "yes" if child_match.group(1) == "yes" else "no"
 
     return adults, children
 
 
 def _extract_address(record: dict[str, Any]) -> tuple[str, str]:
-    postcode = _pick(record, "postcode", "Postcode", "postalCode", "PostalCode")
+    postcode = _first(record, POSTCODE_KEYS)
     if isinstance(postcode, dict):
-        postcode = _pick(postcode, "value", "postcode", "Postcode")
+        postcode = _first(postcode, POSTCODE_VALUE_KEYS)
 
-    address_candidate = _pick(record, "address", "Address")
+    address_candidate = _first(record, ADDRESS_KEYS)
     if isinstance(address_candidate, dict):
         parts = [
-            str(_pick(address_candidate, "line1", "Line1", "addressLine1", "AddressLine1") or "").strip(),
-            str(_pick(address_candidate, "line2", "Line2", "addressLine2", "AddressLine2") or "").strip(),
-            str(_pick(address_candidate, "city", "City", "town", "Town") or "").strip(),
+            str(_first(address_candidate, keys) or "").strip() for keys in NESTED_ADDRESS_PART_KEYS
         ]
         if not postcode:
-            postcode = _pick(address_candidate, "postcode", "Postcode", "postalCode", "PostalCode")
+            postcode = _first(address_candidate, POSTCODE_KEYS)
         address = ", ".join([p for p in parts if p])
     else:
-        parts = [
-            str(_pick(record, "Address1", "address1") or "").strip(),
-            str(_pick(record, "Address2", "address2") or "").strip(),
-            str(_pick(record, "Address3", "address3") or "").strip(),
-            str(_pick(record, "City", "city", "Town", "town") or "").strip(),
-        ]
+        parts = [str(_first(record, keys) or "").strip() for keys in FLAT_ADDRESS_PART_KEYS]
         address = ", ".join([p for p in parts if p])
 
     if not isinstance(postcode, str):
@@ -176,27 +242,20 @@ def _extract_address(record: dict[str, Any]) -> tuple[str, str]:
     return address, postcode.strip().upper()
 
 
-def normalize_nhs_records(records: list[dict[str, Any]]) -> list[dict[str, str]]:
-    normalized: list[dict[str, str]] = []
+def normalize_nhs_records(records: Iterable[dict[str, Any]]) -> list[dict[str, str]]:
+    # Later records win for the same (name, postcode); the first occurrence keeps its position.
+    dedup: dict[tuple[str, str], dict[str, str]] = {}
+    today = date.today().isoformat()
 
     for record in records:
         if not _looks_like_dental(record):
             continue
 
-        name = _pick(record, "practice_name", "name", "Name", "OrganisationName", "organisationName")
+        name = _first(record, NAME_KEYS)
         if not isinstance(name, str) or not name.strip():
             continue
 
-        practice_id = _pick(
-            record,
-            "practice_id",
-            "id",
-            "ID",
-            "OrganisationID",
-            "organisationID",
-            "ODSCode",
-            "odsCode",
-        )
+        practice_id = _first(record, PRACTICE_ID_KEYS)
         if not isinstance(practice_id, str) or not practice_id.strip():
             digest = hashlib.sha1(name.strip().lower().encode("utf-8")).hexdigest()[:12]
             practice_id = f"NHS-{digest}"
@@ -206,9 +265,9 @@ def normalize_nhs_records(records: list[dict[str, Any]]) -> list[dict[str, str]]
             continue
 
         adults, children = _availability_from_record(record)
-        latitude = _pick(record, "Latitude", "latitude")
-        longitude = _pick(record, "Longitude", "longitude")
-        county = _pick(record, "County", "county")
+        latitude = _first(record, LATITUDE_KEYS)
+        longitude = _first(record, LONGITUDE_KEYS)
+        county = _first(record, COUNTY_KEYS)
 
         lat_text = ""
         lon_text = ""
@@ -222,36 +281,61 @@ def normalize_nhs_records(records: list[dict[str, Any]]) -> list[dict[str, str]]
 
         area_code = ""
         if isinstance(county, str) and county.strip():
-            area_code = f"COUNTY::{county.strip().upper()}"
-
-        normalized.append(
-            {
-                "practice_id": practice_id.strip(),
-                "practice_name": name.strip(),
-                "address": address,
-                "postcode": postcode,
-                "postcode_norm": _normalize_postcode(postcode),
-                "lat": str(_pick(record, "Latitude", "latitude") or ""),
-                "lon": str(_pick(record, "Longitude", "longitude") or ""),
-                "area_code": str(_pick(record, "LSOA", "lsoa") or ""),
-                "accepting_adults": adults,
-                "accepting_children": children,
-                "last_reported": date.today().isoformat(),
-                "lat": lat_text,
-                "lon": lon_text,
-                "area_code": area_code,
-            }
-        )
-
-    dedup: dict[tuple[str, str], dict[str, str]] = {}
-    for row in normalized:
-        key = (row["practice_name"].lower(), row["postcode_norm"])
-        dedup[key] = row
+            # Many practices share a county; keep one copy of each code string.
+            area_code = sys.intern(f"COUNTY::{county.strip().upper()}")
+
+        practice_name = name.strip()
+        postcode_norm = _normalize_postcode(postcode)
+        dedup[(practice_name.lower(), postcode_norm)] = {
+            "practice_id": practice_id.strip(),
+            "practice_name": practice_name,
+            "address": address,
+            "postcode": postcode,
+            "postcode_norm": postcode_norm,
+            "lat": lat_text,
+            "lon": lon_text,
+            "area_code": area_code,
+            "accepting_adults": adults,
+            "accepting_children": children,
+            "last_reported": today,
+        }
 
     return list(dedup.values())
 
 
-def fetch_nhs_service_search_pages() -> list[dict[str, Any]]:
+def _decode_body(body: bytes, headers: Any) -> bytes:
+    # Pages are requested with Accept-Encoding: gzip; neither http.client nor urlopen decodes it.
+    if (headers.get("Content-Encoding") or "").strip().lower() == "gzip":
+        return gzip.decompress(body)
+    return body
+
+
+def _load_page_validators() -> dict[str, dict[str, str]]:
+    """Per-page-URL validators, provided the snapshot they were recorded against still exists."""
+    if not ETAGS_PATH.exists() or not RAW_RESPONSE_PATH.exists():
+        return {}
+    try:
+        validators = json.loads(ETAGS_PATH.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return {}
+    return validators if isinstance(validators, dict) else {}
+
+
+def _iter_snapshot_lines(path: Path) -> Iterator[bytes]:
+    """Yield the raw item lines of an NDJSON snapshot, skipping its leading metadata line."""
+    if not path.exists():
+        return
+    with path.open("rb") as f:
+        next(f, None)
+        yield from f
+
+
+def fetch_nhs_service_search_pages() -> Iterator[dict[str, Any]]:
+    """Yield service-search items page by page, streaming them into RAW_RESPONSE_PATH.
+
+    The snapshot is NDJSON: a {"retrieved": ...} line followed by one item per
+    line. It only replaces the previous one once every page has been consumed.
+    """
     subscription_key = os.getenv("NHS_API_SUBSCRIPTION_KEY", "").strip() or os.getenv(
         "NHS_API_SUBSCRIPTION_SECRET", ""
     ).strip()
@@ -266,71 +350,114 @@ def fetch_nhs_service_search_pages() -> list[dict[str, Any]]:
     page_size = int(os.getenv("NHS_SERVICE_SEARCH_PAGE_SIZE", "200"))
     max_pages = int(os.getenv("NHS_SERVICE_SEARCH_MAX_PAGES", "80"))
 
-    all_items: list[dict[str, Any]] = []
-
-    for page in range(max_pages):
-        skip = page * page_size
-        params = urlencode(
-            {
-                "api-version": api_version,
-                "search": search,
-                "$skip": skip,
-                "$top": page_size,
-                "$count": "true",
-            }
-        )
-        url = f"{base_url}?{params}"
-
-        request = Request(
-            url,
-            headers={
-                "apikey": subscription_key,
-                "accept": "application/json",
-                "User-Agent": "dental-deserts-data-pipeline/1.0",
-            },
-        )
-
-        try:
-            with urlopen(request, timeout=25) as response:
-                payload = json.loads(response.read().decode("utf-8"))
-        except HTTPError as exc:
-            body = ""
-            try:
-                body = exc.read().decode("utf-8", errors="ignore")[:500]
-            except Exception:
-                body = ""
-            safe_url = url.split("?", 1)[0]
-            raise RuntimeError(
-                f"NHS API HTTP {exc.code} for {safe_url} (api-version={api_version}). "
-                "Check API product access and key. "
-                f"Body: {body}"
-            ) from exc
-
-        items = _extract_result_items(payload)
-        if not items:
-            break
-
-        all_items.extend(items)
-
-        if len(items) < page_size:
-            break
+    previous_validators = _load_page_validators()
+    page_validators: dict[str, dict[str, str]] = {}
+    # Unchanged (304) pages are copied over from the previous snapshot as it is read alongside.
+    previous_lines = _iter_snapshot_lines(RAW_RESPONSE_PATH)
+    previous_position = 0
+    # Pages are fetched over one kept-alive connection rather than a new TLS handshake each.
+    client = KeepAliveClient(timeout=25)
 
     RAW_RESPONSE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    RAW_RESPONSE_PATH.write_text(
-        json.dumps({"retrieved": date.today().isoformat(), "items": all_items}, separators=(",", ":")),
-        encoding="utf-8",
-    )
-
-    return all_items
+    tmp_path = RAW_RESPONSE_PATH.with_suffix(RAW_RESPONSE_PATH.suffix + ".tmp")
+    completed = False
+    try:
+        with tmp_path.open("wb") as out:
+            out.write(_dumps_json({"retrieved": date.today().isoformat()}))
+            for page in range(max_pages):
+                skip = page * page_size
+                params = urlencode(
+                    {
+                        "api-version": api_version,
+                        "search": search,
+                        "$skip": skip,
+                        "$top": page_size,
+                        "$count": "true",
+                    }
+                )
+                url = f"{base_url}?{params}"
+
+                headers = {
+                    "apikey": subscription_key,
+                    "accept": "application/json",
+                    "User-Agent": "dental-deserts-data-pipeline/1.0",
+                    "Accept-Encoding": "gzip",
+                }
+                cached = previous_validators.get(url) or {}
+                if cached.get("etag"):
+                    headers["If-None-Match"] = str(cached["etag"])
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = str(cached["last_modified"])
+
+                raw: bytes | None
+                try:
+                    raw, response_headers = client.request("GET", url, headers=headers)
+                    raw = _decode_body(raw, response_headers)
+                except HTTPError as exc:
+                    if exc.code == 304:
+                        # Unchanged page: earlier pages were all full, so it sits at the same offset.
+                        raw = None
+                        page_validators[url] = cached
+                    else:
+                        body = ""
+                        try:
+                            body = _decode_body(exc.read(), exc.headers).decode(
+                                "utf-8", errors="ignore"
+                            )[:500]
+                        except Exception:
+                            body = ""
+                        safe_url = url.split("?", 1)[0]
+                        raise RuntimeError(
+                            f"NHS API HTTP {exc.code} for {safe_url} (api-version={api_version}). "
+                            "Check API product access and key. "
+                            f"Body: {body}"
+                        ) from exc
+
+                if raw is None:
+                    start = skip - previous_position
+                    lines = list(islice(previous_lines, start, start + page_size))
+                    previous_position = skip + len(lines)
+                    out.writelines(lines)
+                    items = [_loads_json(line) for line in lines]
+                else:
+                    items = _extract_result_items(_loads_json(raw))
+                    out.writelines(_dumps_json(item) for item in items)
+                    etag = response_headers.get("ETag") or ""
+                    last_modified = response_headers.get("Last-Modified") or ""
+                    if etag or last_modified:
+                        page_validators[url] = {"etag": etag, "last_modified": last_modified}
+
+                if not items:
+                    break
+
+                yield from items
+
+                if len(items) < page_size:
+                    break
+        completed = True
+    finally:
+        previous_lines.close()
+        client.close()
+        if completed:
+            # Drop the validators first so they never describe a snapshot they were not recorded with.
+            ETAGS_PATH.unlink(missing_ok=True)
+            tmp_path.replace(RAW_RESPONSE_PATH)
+            if page_validators:
+                ETAGS_PATH.write_text(json.dumps(page_validators, indent=2), encoding="utf-8")
+        else:
+            tmp_path.unlink(missing_ok=True)
 
 
 def write_normalized_snapshot(rows: list[dict[str, str]]) -> None:
     NORMALIZED_PATH.parent.mkdir(parents=True, exist_ok=True)
-    NORMALIZED_PATH.write_text(json.dumps(rows, separators=(",", ":")), encoding="utf-8")
+    NORMALIZED_PATH.write_bytes(_dumps_json(rows))
 
 
 def read_normalized_snapshot() -> list[dict[str, str]]:
     if not NORMALIZED_PATH.exists():
         return []
-    content = json.loads(NORMALIZED_PATH.read_text(encoding="utf-8"))
+    if orjson is not None:
+        content = orjson.loads(NORMALIZED_PATH.read_bytes())
+    else:
+        content = json.loads(NORMALIZED_PATH.read_text(encoding="utf-8"))
     return [x for x in content if isinstance(x, dict)]
@@ -0,0 +1,80 @@
+"""Tests for the postcodes.io batch-response cache in enrich_practices_lsoa."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from unittest import mock
+from urllib.error import URLError
+import json
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import enrich_practices_lsoa as enrich  # noqa: E402
+
+BATCH = ["SW1A1AA"]
+GOOD_BODY = json.dumps(
+    {
+        "status": 200,
+        "result": [
+            {
+                "query": "SW1A1AA",
+                "result": {
+                    "lsoa": "Westminster 018C",
+                    "msoa": "Westminster 018",
+                    "codes": {"lsoa": "E01004736", "msoa": "E02000977"},
+                },
+            }
+        ],
+    }
+).encode("utf-8")
+
+
+class BatchCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(enrich, "BATCH_CACHE_DIR", Path(tmp.name) / "batches")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch_with_body(self, body: bytes) -> tuple[dict[str, dict[str, str]], bool]:
+        with mock.patch.object(enrich, "post_postcodes", return_value=body) as post:
+            result = enrich.fetch_postcodes_lsoa(BATCH)
+        self.posts = post.call_count
+        return result
+
+    def test_good_response_is_cached_and_replayed(self) -> None:
+        results, replayed = self.fetch_with_body(GOOD_BODY)
+        self.assertFalse(replayed)
+        self.assertEqual(results["SW1A1AA"]["lsoa_code"], "E01004736")
+
+        results, replayed = self.fetch_with_body(b"unused")
+        self.assertTrue(replayed)
+        self.assertEqual(self.posts, 0)
+        self.assertEqual(results["SW1A1AA"]["lsoa_code"], "E01004736")
+
+    def test_bad_response_is_rejected_and_not_cached(self) -> None:
+        for body in (b"<html>maintenance</html>", b'{"result": [', b'{"status": 200}', b"[]"):
+            with self.subTest(body=body):
+                with self.assertRaises(URLError):
+                    self.fetch_with_body(body)
+                self.assertFalse(enrich.batch_cache_path(BATCH).exists())
+                self.assertEqual(list(enrich.BATCH_CACHE_DIR.glob("*.tmp")), [])
+
+    def test_unparseable_cached_file_is_dropped_and_refetched(self) -> None:
+        cache_path = enrich.batch_cache_path(BATCH)
+        cache_path.parent.mkdir(parents=True)
+        cache_path.write_bytes(b"<html>maintenance</html>")
+
+        results, replayed = self.fetch_with_body(GOOD_BODY)
+        self.assertFalse(replayed)
+        self.assertEqual(self.posts, 1)
+        self.assertEqual(results["SW1A1AA"]["lsoa"], "Westminster 018C")
+        self.assertEqual(cache_path.read_bytes(), GOOD_BODY)
+
+
+if __name__ == "__main__":
+    unittest.main()
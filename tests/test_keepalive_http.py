@@ -0,0 +1,188 @@
+"""Tests for the shared keep-alive HTTP client, against a local http.server."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from unittest import mock
+from urllib.error import HTTPError, URLError
+import http.server
+import os
+import sys
+import threading
+import unittest
+import urllib.request
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from keepalive_http import KeepAliveClient  # noqa: E402
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Routes: /ok, /status/<code>, /redirect/<code>/<target path>, /loop, /drop, /close-after."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.route()
+
+    def do_POST(self) -> None:
+        self.route()
+
+    def route(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        server = self.server
+        with server.lock:
+            server.requests.append(
+                (self.command, self.path, self.headers.get("Content-Type"), body, self.client_address)
+            )
+        path = self.path
+        if path.startswith("/redirect/"):
+            _, _, code, target = path.split("/", 3)
+            self.reply(int(code), b"", {"Location": "/" + target})
+        elif path == "/loop":
+            self.reply(302, b"", {"Location": "/loop"})
+        elif path.startswith("/status/"):
+            self.reply(int(path.rsplit("/", 1)[1]), b"error body")
+        elif path == "/drop":
+            # Close without answering, like a server that has just reaped the socket.
+            self.close_connection = True
+        elif path == "/close-after":
+            # Answer, then close without a Connection: close header, leaving the client's socket stale.
+            self.reply(200, b"closing")
+            self.close_connection = True
+        else:
+            self.reply(200, f"{self.command} {path}".encode("utf-8"))
+
+    def reply(self, status: int, body: bytes, headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+class KeepAliveClientTest(unittest.TestCase):
+    def setUp(self) -> None:
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        server.lock = threading.Lock()
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        self.base = f"http://127.0.0.1:{server.server_port}"
+
+        # Keep any proxy settings of the machine running the tests out of the way.
+        env = mock.patch.dict(os.environ, {"no_proxy": "", "NO_PROXY": ""})
+        env.start()
+        self.addCleanup(env.stop)
+        for key in ("http_proxy", "HTTP_PROXY", "https_proxy", "HTTPS_PROXY", "all_proxy", "ALL_PROXY"):
+            os.environ.pop(key, None)
+
+        self.client = KeepAliveClient(timeout=5)
+        self.addCleanup(self.client.close)
+
+    def connections_used(self) -> int:
+        return len({request[4] for request in self.server.requests})
+
+    def test_requests_share_one_connection(self) -> None:
+        for i in range(3):
+            body, _ = self.client.request("GET", f"{self.base}/ok?page={i}")
+            self.assertEqual(body, f"GET /ok?page={i}".encode("utf-8"))
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.connections_used(), 1)
+
+    def test_close_drops_the_connection(self) -> None:
+        self.client.request("GET", f"{self.base}/ok")
+        self.client.close()
+        self.client.request("GET", f"{self.base}/ok")
+        self.assertEqual(self.connections_used(), 2)
+
+    def test_redirect_chain_is_followed(self) -> None:
+        body, _ = self.client.request("GET", f"{self.base}/redirect/301/redirect/307/redirect/308/ok")
+        self.assertEqual(body, b"GET /ok")
+        self.assertEqual([request[1] for request in self.server.requests][-1], "/ok")
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_post_redirected_with_303_continues_as_bodyless_get(self) -> None:
+        body, _ = self.client.request(
+            "POST",
+            f"{self.base}/redirect/303/ok",
+            b'{"postcodes": []}',
+            {"Content-Type": "application/json"},
+        )
+        self.assertEqual(body, b"GET /ok")
+        method, path, content_type, sent, _ = self.server.requests[-1]
+        self.assertEqual((method, path, content_type, sent), ("GET", "/ok", None, b""))
+
+    def test_post_is_not_replayed_through_307(self) -> None:
+        with self.assertRaises(HTTPError) as caught:
+            self.client.request("POST", f"{self.base}/redirect/307/ok", b"{}")
+        self.assertEqual(caught.exception.code, 307)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_redirect_loop_stops(self) -> None:
+        with self.assertRaises(HTTPError) as caught:
+            self.client.request("GET", f"{self.base}/loop")
+        self.assertEqual(caught.exception.code, 302)
+        self.assertEqual(len(self.server.requests), 11)
+
+    def test_error_statuses_raise_http_error_with_body(self) -> None:
+        with self.assertRaises(HTTPError) as caught:
+            self.client.request("GET", f"{self.base}/status/404")
+        self.assertEqual(caught.exception.code, 404)
+        self.assertEqual(caught.exception.read(), b"error body")
+
+        with self.assertRaises(HTTPError) as caught:
+            self.client.request("GET", f"{self.base}/status/304")
+        self.assertEqual(caught.exception.code, 304)
+
+        # The connection stays usable after an error response.
+        self.client.request("GET", f"{self.base}/ok")
+        self.assertEqual(self.connections_used(), 1)
+
+    def test_transport_failure_raises_url_error(self) -> None:
+        port = self.server.server_port
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(URLError) as caught:
+            KeepAliveClient(timeout=5).request("GET", f"http://127.0.0.1:{port}/ok")
+        self.assertNotIsInstance(caught.exception, HTTPError)
+
+    def test_stale_reused_connection_is_retried_once(self) -> None:
+        self.client.request("GET", f"{self.base}/close-after")
+        body, _ = self.client.request("GET", f"{self.base}/ok")
+        self.assertEqual(body, b"GET /ok")
+        self.assertEqual(self.connections_used(), 2)
+
+    def test_drop_on_fresh_connection_is_not_retried(self) -> None:
+        with self.assertRaises(URLError):
+            self.client.request("GET", f"{self.base}/drop")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_proxy_is_used_when_configured(self) -> None:
+        # The local server stands in for the proxy; with a proxy, urllib sends the absolute URL.
+        os.environ["http_proxy"] = self.base
+        with mock.patch.object(urllib.request, "_opener", None):
+            body, _ = self.client.request("GET", "http://example.invalid/ok")
+        self.assertEqual(body, b"GET http://example.invalid/ok")
+
+    def test_no_proxy_hosts_bypass_the_proxy(self) -> None:
+        os.environ["http_proxy"] = "http://127.0.0.1:9"
+        os.environ["no_proxy"] = "127.0.0.1"
+        with mock.patch.object(urllib.request, "_opener", None):
+            self.client.request("GET", f"{self.base}/ok")
+            self.client.request("GET", f"{self.base}/ok")
+        self.assertEqual(self.connections_used(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
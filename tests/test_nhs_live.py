@@ -0,0 +1,51 @@
+"""Tests for the NHS service-search record helpers in nhs_live."""
+
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import nhs_live  # noqa: E402
+
+
+class AvailabilityFromRecordTest(unittest.TestCase):
+    def test_none_and_empty_values_fall_through_to_the_next_key(self) -> None:
+        record = {
+            "accepting_adults": None,
+            "acceptingAdults": "",
+            "AcceptingAdults": "Yes",
+            "accepting_children": "",
+            "AcceptingNewNHSChildPatients": "no",
+        }
+        self.assertEqual(nhs_live._availability_from_record(record), ("yes", "no"))
+
+    def test_false_is_an_answer_not_a_miss(self) -> None:
+        record = {"accepting_adults": False, "acceptingAdults": "yes", "accepting_children": 0}
+        self.assertEqual(nhs_live._availability_from_record(record), ("no", "no"))
+
+    def test_all_keys_missing_or_empty_reads_unknown(self) -> None:
+        record = {"accepting_adults": "", "accepting_children": None, "Name": "Smile Dental"}
+        self.assertEqual(nhs_live._availability_from_record(record), ("unknown", "unknown"))
+
+
+
+class ExtractAddressTest(unittest.TestCase):
+    def test_nested_address_with_postcode_object(self) -> None:
+        record = {
+            "postcode": {"value": " sw1a 1aa "},
+            "address": {"line1": "1 High St", "Line2": "", "addressLine2": "Floor 2", "town": "London"},
+        }
+        self.assertEqual(
+            nhs_live._extract_address(record), ("1 High St, Floor 2, London", "SW1A 1AA")
+        )
+
+    def test_flat_address_fields(self) -> None:
+        record = {"Address1": "2 Low Rd", "address2": None, "Address3": "", "city": "Leeds", "PostalCode": "ls1 1aa"}
+        self.assertEqual(nhs_live._extract_address(record), ("2 Low Rd, Leeds", "LS1 1AA"))
+
+
+if __name__ == "__main__":
+    unittest.main()